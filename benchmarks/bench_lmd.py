@@ -0,0 +1,306 @@
+"""Parse and build benchmarks on synthetic LMD files.
+
+The parse stages don't need Blender:
+
+    python benchmarks/bench_lmd.py
+
+Run through Blender to also time the stages creating datablocks:
+
+    blender -b --factory-startup -P benchmarks/bench_lmd.py -- --quick
+
+Timings are the best of --repeat runs, peak memory is traced in a separate
+run. --save-baseline stores the results, later runs are compared against them.
+Every case is first parsed and checked against the data it was generated from.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import io_import_pokemon_masters as lmd_import
+from synth_lmd import IndexSize, WriteLmd
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Together these cover both vertex layouts, every face index width and the
+# 1 byte vertex and face buffer sizes of tiny meshes
+CASES = {
+    "1.2-tiny": dict(Version="1.2+", VertCount=5, FaceCount=4, BoneCount=4, MeshCount=2),
+    "1.0-color-u8": dict(Version="1.0", VertChunkSize=0x24, VertCount=200, FaceCount=300, BoneCount=40, MeshCount=8),
+    "1.0-u16": dict(Version="1.0", VertChunkSize=0x20, VertCount=20000, FaceCount=30000, BoneCount=120, MeshCount=4),
+    "1.2-u16": dict(Version="1.2+", VertCount=50000, FaceCount=80000, BoneCount=320, MeshCount=4,
+                    MaterialCount=12, TextureCount=24),
+    "1.2-u32": dict(Version="1.2+", VertCount=80000, FaceCount=120000, BoneCount=320, MeshCount=2),
+}
+QUICK_SCALE = 0.1
+# Stages going over the whole file or every vertex, throughput is reported for these
+THROUGHPUT_STAGES = {"read", "meshes", "weights", "weld", "cache_key", "cache_store", "cache_load", "build_meshes"}
+
+
+def Scaled(Case, Scale):
+    Case = dict(Case)
+    if Case["VertCount"] * Case.get("VertChunkSize", 0x28) < 0x100:
+        # Already below every size threshold
+        return Case
+    # Stay on the same side of the face index width thresholds
+    Low, High = {1: (1, 0xFF), 2: (0x100, 0xFFFF), 4: (0x10000, 1 << 31)}[IndexSize(Case["VertCount"])]
+    Case["VertCount"] = min(max(int(Case["VertCount"] * Scale), Low), High)
+    Case["FaceCount"] = max(int(Case["FaceCount"] * Scale), 1)
+    return Case
+
+
+def Measure(Function, Repeat):
+    Best = float('inf')
+    for x in range(Repeat):
+        Start = time.perf_counter()
+        Function()
+        Best = min(Best, time.perf_counter() - Start)
+    tracemalloc.start()
+    try:
+        Function()
+        Peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return Best, Peak
+
+
+def CheckParsed(filepath, Version, Meshes):
+    """Names of the parsed mesh fields differing from the generated data"""
+    Errors = []
+    Parsed = lmd_import.ReadLmd(filepath, Version)["Meshes"]
+    if [x["Name"] for x in Parsed] != [x["Name"] for x in Meshes]:
+        return ["mesh names"]
+    for Mesh, Expected in zip(Parsed, Meshes):
+        Verts = Expected["Vertices"]
+        UVs = Verts["UV"].astype(np.float32)
+        UVs[:, 1] = 1 - UVs[:, 1]
+        Weights = Verts["Weight"] / 65535 if Version == "1.0" else Verts["Weight"]
+        # bmesh dropped degenerate and repeated triangles, the first one is kept
+        Faces, Seen = [], set()
+        for Face in Expected["Faces"].tolist():
+            if len(set(Face)) == 3 and frozenset(Face) not in Seen:
+                Seen.add(frozenset(Face))
+                Faces.append(Face)
+        Checks = {
+            "positions": np.array_equal(Mesh["Positions"], Verts["Position"]),
+            "uvs": np.array_equal(Mesh["UVs"], UVs),
+            "bone indices": np.array_equal(Mesh["BoneIndices"], Verts["BoneIndex"]),
+            "weights": np.allclose(Mesh["Weights"], Weights, atol=1e-6),
+            "faces": np.array_equal(Mesh["Faces"], np.array(Faces, dtype=np.int32).reshape(-1, 3)),
+            "weight bones": np.array_equal(Mesh["WeightBoneIDs"], Expected["WeightBones"]),
+        }
+        if "Color" in Verts.dtype.names:
+            Checks["colors"] = np.allclose(Mesh["Colors"], Verts["Color"] / 255, atol=1e-6)
+        Errors += ["{} {}".format(Mesh["Name"], Name) for Name, bOk in Checks.items() if not bOk]
+    return Errors
+
+
+def ParseStages(filepath, Version, WorkDir):
+    """Stages that run without Blender, as name -> function"""
+    with lmd_import.LmdReader(filepath) as lmd:
+        MeshOffsets = lmd.pointer_table(0x48)
+        BoneData = lmd.pointer(0x34)
+        MaterialData = lmd.pointer(0x38)
+    Data = lmd_import.ReadLmd(filepath, Version)
+    Cache = lmd_import.ModelCache(os.path.join(WorkDir, "cache"))
+    os.makedirs(Cache.directory, exist_ok=True)
+    Key = Cache.key(filepath, Version)
+    Cache.store(Key, Data)
+
+    def Skeleton():
+        with lmd_import.LmdReader(filepath) as lmd:
+            lmd_import.ReadSkeleton(lmd, BoneData)
+
+    def Materials():
+        with lmd_import.LmdReader(filepath) as lmd:
+            lmd_import.ParseMaterials(lmd, MaterialData)
+
+    def Meshes():
+        with lmd_import.LmdReader(filepath) as lmd:
+            BoneIDs = lmd_import.SkeletonBoneIDs(lmd_import.ReadSkeleton(lmd, BoneData))
+            for x in MeshOffsets:
+                lmd_import.ReadMeshChunk(lmd, x, Version, BoneIDs)
+
+    def Weights():
+        for Mesh in Data["Meshes"]:
+            lmd_import.GroupWeights(Mesh["BoneIndices"], Mesh["Weights"], len(Mesh["WeightBones"]))
+
+    def Weld():
+        for Mesh in Data["Meshes"]:
+            lmd_import.WeldVertices(Mesh["Positions"], Mesh["BoneIndices"], Mesh["Weights"], 0.00001)
+
+    def CacheLoad():
+        Loaded = Cache.load(Key, filepath)
+        # Touch every array so the mapping is actually read
+        for Mesh in Loaded["Meshes"]:
+            for Value in Mesh.values():
+                if hasattr(Value, "sum"):
+                    Value.sum()
+
+    return {
+        "read": lambda: lmd_import.ReadLmd(filepath, Version),
+        "skeleton": Skeleton,
+        "materials": Materials,
+        "meshes": Meshes,
+        "rest_matrices": lambda: lmd_import.BoneRestMatrices(Data["Skeleton"]),
+        "weights": Weights,
+        "weld": Weld,
+        "cache_key": lambda: Cache.key(filepath, Version),
+        "cache_store": lambda: Cache.store(Key + "-bench", Data),
+        "cache_load": CacheLoad,
+    }
+
+
+def BuildStages(filepath, Version):
+    """Stages creating Blender datablocks, as name -> function"""
+    import bpy
+    Data = lmd_import.ReadLmd(filepath, Version)
+
+    def Cleanup(Objects):
+        for obj in Objects:
+            Owner = obj.data
+            bpy.data.objects.remove(obj)
+            if isinstance(Owner, bpy.types.Mesh):
+                bpy.data.meshes.remove(Owner)
+            elif isinstance(Owner, bpy.types.Armature):
+                bpy.data.armatures.remove(Owner)
+
+    def Skeleton():
+        Cleanup([lmd_import.BuildSkeleton(Data["Name"], Data["Skeleton"])])
+
+    def Meshes():
+        Armature = lmd_import.BuildSkeleton(Data["Name"], Data["Skeleton"])
+        Objects = [lmd_import.BuildMesh(Mesh, Armature) for Mesh in Data["Meshes"]]
+        Cleanup(Objects + [Armature])
+
+    return {"build_skeleton": Skeleton, "build_meshes": Meshes}
+
+
+def TextureIndexStage(WorkDir, FileCount):
+    Root = os.path.join(WorkDir, "textures")
+    for x in range(FileCount):
+        Folder = os.path.join(Root, "ch{:04d}".format(x // 50))
+        os.makedirs(Folder, exist_ok=True)
+        open(os.path.join(Folder, "ch{:04d}_{:02d}_co.ktx.png".format(x // 50, x % 50)), 'wb').close()
+
+    def Run():
+        Index = lmd_import.TextureIndex(Root)
+        Index.refresh()
+        for x in range(0, FileCount, 7):
+            Index.find("ch{:04d}_{:02d}_co*.png".format(x // 50, x % 50))
+    return Run
+
+
+def RunSuite(args, WorkDir):
+    try:
+        import bpy
+        bHasBlender = True
+    except ImportError:
+        bHasBlender = False
+
+    Results, Errors = {}, []
+    for CaseName, Case in CASES.items():
+        if args.case and CaseName not in args.case:
+            continue
+        Case = Scaled(Case, QUICK_SCALE if args.quick else 1)
+        filepath = os.path.join(WorkDir, CaseName + ".lmd")
+        Meshes = []
+        FileSize = WriteLmd(filepath, Meshes=Meshes, **Case)
+        Verts = Case["VertCount"] * Case.get("MeshCount", 1)
+        Errors += ["{}: {}".format(CaseName, x) for x in CheckParsed(filepath, Case["Version"], Meshes)]
+
+        Stages = ParseStages(filepath, Case["Version"], WorkDir)
+        if bHasBlender:
+            Stages.update(BuildStages(filepath, Case["Version"]))
+        for StageName, Function in Stages.items():
+            Seconds, Peak = Measure(Function, args.repeat)
+            Result = {"seconds": Seconds, "peak_bytes": Peak}
+            if StageName in THROUGHPUT_STAGES and Seconds:
+                Result["vertices_per_second"] = Verts / Seconds
+                Result["mb_per_second"] = FileSize / 1e6 / Seconds
+            Results["{}/{}".format(CaseName, StageName)] = Result
+
+    if not args.case:
+        Seconds, Peak = Measure(TextureIndexStage(WorkDir, 500 if args.quick else 20000), args.repeat)
+        Results["tree/texture_index"] = {"seconds": Seconds, "peak_bytes": Peak}
+    return Results, Errors
+
+
+def Report(Results, Baseline, Tolerance):
+    Regressions = []
+    print("{:<28} {:>10} {:>12} {:>9} {:>10}  {}".format(
+        "stage", "ms", "Mverts/s", "MB/s", "peak MB", "vs baseline"))
+    for Name, Result in Results.items():
+        Compared = ""
+        Base = Baseline.get(Name)
+        if Base and Base.get("seconds"):
+            Ratio = Result["seconds"] / Base["seconds"]
+            Compared = "{:+.1f}%".format((Ratio - 1) * 100)
+            if Ratio > 1 + Tolerance:
+                Compared += "  REGRESSION"
+                Regressions.append(Name)
+        Throughput = Result.get("vertices_per_second")
+        Bandwidth = Result.get("mb_per_second")
+        print("{:<28} {:>10.2f} {:>12} {:>9} {:>10.1f}  {}".format(
+            Name, Result["seconds"] * 1000,
+            "{:.2f}".format(Throughput / 1e6) if Throughput else "-",
+            "{:.1f}".format(Bandwidth) if Bandwidth else "-",
+            Result["peak_bytes"] / 2 ** 20, Compared))
+    return Regressions
+
+
+def main(argv=None):
+    if argv is None:
+        # Blender passes the script arguments after "--"
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="Benchmark LMD parsing and building on synthetic files")
+    parser.add_argument('--quick', action='store_true', help="use files a tenth of the size")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help="only run these cases")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="slowdown ratio over the baseline reported as a regression")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    WorkDir = tempfile.mkdtemp(prefix="lmd_bench_")
+    try:
+        Results, Errors = RunSuite(args, WorkDir)
+    finally:
+        shutil.rmtree(WorkDir, ignore_errors=True)
+
+    Baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            Baseline = json.load(f)
+    Regressions = Report(Results, Baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(Results, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(Results, f, indent=1)
+        print("Saved baseline to {}".format(args.baseline))
+    for Error in Errors:
+        print("PARSE MISMATCH {}".format(Error))
+    if Errors:
+        return 1
+    if Regressions:
+        print("{} stage{} slower than the baseline".format(len(Regressions), '' if len(Regressions) == 1 else 's'))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Synthetic LMD file generator.
+
+Writes files with the layout the importer reads (header, skeleton, texture and
+material tables, mesh chunks) filled with random but valid data, so parsing
+can be exercised and timed without game assets.
+
+    python benchmarks/synth_lmd.py out.lmd --version 1.0 --verts 70000
+"""
+import argparse
+import math
+import struct
+
+import numpy as np
+
+
+def IndexSize(Value):
+    """Byte width the importer picks for a count or index range"""
+    if Value < 0x100:
+        return 1
+    elif Value < 0x10000:
+        return 2
+    return 4
+
+
+class _Writer:
+    """Append-only buffer, relative offsets always point forward"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def alloc(self, Size, Align=4):
+        self.data += b'\0' * (-len(self.data) % Align)
+        Offset = len(self.data)
+        self.data += b'\0' * Size
+        return Offset
+
+    def put(self, Offset, fmt, *Values):
+        struct.pack_into(fmt, self.data, Offset, *Values)
+
+    def point(self, At, Target):
+        self.put(At, '<I', Target - At)
+
+    def table(self, At, Index, Target):
+        self.point(At + 4 + 4 * Index, Target)
+
+    def string(self, Text):
+        Encoded = Text.encode('utf-8')
+        Offset = self.alloc(4 + len(Encoded))
+        self.put(Offset, '<I', len(Encoded))
+        self.data[Offset + 4:Offset + 4 + len(Encoded)] = Encoded
+        return Offset
+
+
+def _RandomRotations(rng, Count):
+    Axes = rng.normal(size=(Count, 3))
+    Axes /= np.linalg.norm(Axes, axis=1, keepdims=True)
+    Angles = rng.uniform(-math.pi, math.pi, Count)
+    x, y, z = Axes.T
+    c, s = np.cos(Angles), np.sin(Angles)
+    C = 1 - c
+    return np.stack([
+        np.stack([c + x * x * C, x * y * C - z * s, x * z * C + y * s], axis=1),
+        np.stack([y * x * C + z * s, c + y * y * C, y * z * C - x * s], axis=1),
+        np.stack([z * x * C - y * s, z * y * C + x * s, c + z * z * C], axis=1),
+    ], axis=1)
+
+
+def GenerateLmd(Version="1.2+", VertCount=1000, FaceCount=1500, BoneCount=16, MaterialCount=2,
+                TextureCount=2, MeshCount=1, VertChunkSize=None, WeightBoneCount=None, Seed=0, Meshes=None):
+    """Return the bytes of a synthetic LMD file.
+
+    VertCount and FaceCount (triangles) are per mesh. VertCount picks the face
+    index width, below 0x100 gives 1 byte, below 0x10000 2 and 4 otherwise.
+    With version 1.0 a VertChunkSize of 0x24 or more adds vertex colors.
+    When Meshes is a list, the vertices, faces and weight bones written for
+    every mesh are appended to it, to check parsed files against.
+    """
+    rng = np.random.default_rng(Seed)
+    if VertChunkSize is None:
+        VertChunkSize = 0x24 if Version == "1.0" else 0x28
+    bHasColor = (VertChunkSize >= 0x24) and (Version == "1.0")
+    if bHasColor:
+        Stride = VertChunkSize
+    elif Version == "1.0":
+        Stride = 0x20
+    else:
+        Stride = 0x28
+
+    w = _Writer()
+    Header = w.alloc(0x4C + 4 * MeshCount)
+    w.put(Header + 0x48, '<I', MeshCount)
+
+    #Skeleton
+    BoneNames = ['bone_{:03d}'.format(x) for x in range(BoneCount)]
+    Parents = [-1] + [int(rng.integers(0, x)) for x in range(1, BoneCount)]
+    Rotations = _RandomRotations(rng, BoneCount)
+    BoneData = w.alloc(8 + 4 + 4 * BoneCount)
+    w.point(Header + 0x34, BoneData)
+    w.put(BoneData + 8, '<I', BoneCount)
+    for x in range(BoneCount):
+        Bone = w.alloc(0x4C)
+        w.table(BoneData + 8, x, Bone)
+        w.put(Bone, '<I', 0x1000 if Parents[x] < 0 else 0x5000 + x)
+        Matrix = np.eye(4, dtype='<f4')
+        Matrix[:3, :3] = Rotations[x]
+        Matrix[3, :3] = rng.uniform(-0.2, 0.2, 3)
+        w.data[Bone + 8:Bone + 0x48] = Matrix.tobytes()
+        w.point(Bone + 4, w.string(BoneNames[x]))
+        w.point(Bone + 0x48, w.string(BoneNames[Parents[x] if Parents[x] >= 0 else x]))
+
+    #Textures and materials
+    MaterialData = w.alloc(12 + 4 + 4 * TextureCount)
+    w.point(Header + 0x38, MaterialData)
+    w.put(MaterialData + 12, '<I', TextureCount)
+    TextureRefs = ['tex_ref_{}'.format(x) for x in range(TextureCount)]
+    for x in range(TextureCount):
+        Texture = w.alloc(16)
+        w.table(MaterialData + 12, x, Texture)
+        w.point(Texture + 4, w.string(TextureRefs[x]))
+        w.point(Texture + 8, w.string('synth_{:02d}_co.tga'.format(x)))
+        w.point(Texture + 12, w.string('map_{}'.format(x)))
+
+    MaterialNames = ['mat_{:02d}{}'.format(x, 'face' if x % 3 == 2 else '') for x in range(MaterialCount)]
+    MaterialTable = w.alloc(4 + 4 * MaterialCount)
+    w.point(MaterialData + 4, MaterialTable)
+    w.put(MaterialTable, '<I', MaterialCount)
+    for x in range(MaterialCount):
+        # Alternate both texture slot table positions
+        Flag = 0x40000000 if x % 2 else 0
+        SlotTable = 0x44 if Flag else 0x40
+        SlotCount = min(2, TextureCount)
+        Material = w.alloc(SlotTable + 4 + 4 * SlotCount)
+        w.table(MaterialTable, x, Material)
+        w.point(Material + 4, w.string(MaterialNames[x]))
+        w.put(Material + 0x38, '<I', Flag)
+        w.put(Material + SlotTable, '<I', SlotCount)
+        for y in range(SlotCount):
+            w.table(Material + SlotTable, y, w.string(TextureRefs[(x + y) % TextureCount]))
+
+    #Meshes
+    Dtype = np.dtype({
+        'names': ['Position', 'Normal', 'Color', 'UV', 'BoneIndex', 'Weight'] if bHasColor else
+                 ['Position', 'Normal', 'UV', 'BoneIndex', 'Weight'],
+        'formats': (['<3f4', '4i1', '4u1', '<2f2', '4u1'] if bHasColor else ['<3f4', '4i1', '<2f2', '4u1'])
+                   + (['<4u2'] if Version == "1.0" else ['<4f4']),
+        'offsets': ([0, 12, 16, 20, VertChunkSize - 12] if bHasColor else [0, 12, 16, 20])
+                   + ([Stride - 8] if Version == "1.0" else [Stride - 16]),
+        'itemsize': Stride})
+    for m in range(MeshCount):
+        if WeightBoneCount is None:
+            WeightBoneCount = min(BoneCount, 32)
+        WeightBones = rng.choice(BoneCount, WeightBoneCount, replace=False)
+
+        Verts = np.zeros(VertCount, dtype=Dtype)
+        Verts['Position'] = rng.uniform(-1, 1, (VertCount, 3))
+        Normals = rng.normal(size=(VertCount, 3))
+        Normals /= np.linalg.norm(Normals, axis=1, keepdims=True)
+        Verts['Normal'][:, :3] = np.rint(Normals * 127)
+        Verts['UV'] = rng.uniform(0, 1, (VertCount, 2))
+        if bHasColor:
+            Verts['Color'] = rng.integers(0, 256, (VertCount, 4))
+        Verts['BoneIndex'] = rng.integers(0, WeightBoneCount, (VertCount, 4))
+        Weights = rng.uniform(0, 1, (VertCount, 4))
+        Weights[:, 2:] *= rng.uniform(0, 1, (VertCount, 1)) < 0.5
+        Weights /= Weights.sum(axis=1, keepdims=True)
+        Verts['Weight'] = np.rint(Weights * 65535) if Version == "1.0" else Weights
+
+        FSize = IndexSize(VertCount)
+        Faces = rng.integers(0, VertCount, (FaceCount, 3)).astype('<u{}'.format(FSize))
+        IndexCount = FaceCount * 3
+
+        Size = IndexSize(VertCount * VertChunkSize)
+        UnknownSize = 2 if Size == 1 else 4
+        FaceSizeSize = IndexSize(IndexCount)
+        UnknownCount = 1
+        Body = bytearray()
+        Body += (VertCount * Stride).to_bytes(Size, 'little')
+        Body += Verts.tobytes()
+        Body += b'\0' * (Size + UnknownSize)
+        Body += struct.pack('<I', UnknownCount) + b'\0' * (0x10 * UnknownCount)
+        Body += struct.pack('<I', IndexCount)
+        Body += ((IndexCount * FSize) % (1 << (8 * FaceSizeSize))).to_bytes(FaceSizeSize, 'little')
+        Body += Faces.tobytes()
+
+        Chunk = w.alloc(0x90)
+        w.data += Body
+        w.table(Header + 0x48, m, Chunk)
+        w.put(Chunk + 7, '<B', VertChunkSize)
+        w.point(Chunk + 0x8, w.string('mesh_{:02d}'.format(m)))
+        MaterialRef = w.alloc(8)
+        w.string(MaterialNames[m % MaterialCount])
+        w.point(Chunk + 0x14, MaterialRef)
+        WeightBoneNames = w.alloc(4 + 4 * WeightBoneCount)
+        w.put(WeightBoneNames, '<I', WeightBoneCount)
+        for x, Bone in enumerate(WeightBones):
+            w.table(WeightBoneNames, x, w.string(BoneNames[Bone]))
+        w.point(Chunk + 0x58, WeightBoneNames)
+        WeightBoneTable = w.alloc(4 + 2 * WeightBoneCount)
+        w.put(WeightBoneTable, '<I', WeightBoneCount)
+        w.data[WeightBoneTable + 4:WeightBoneTable + 4 + 2 * WeightBoneCount] = WeightBones.astype('<u2').tobytes()
+        w.point(Chunk + 0x5C, WeightBoneTable)
+        w.put(Chunk + 0x78, '<I', IndexCount)
+        w.put(Chunk + 0x84, '<I', VertCount)
+        if Meshes is not None:
+            Meshes.append({"Name": 'mesh_{:02d}'.format(m), "Vertices": Verts, "Faces": Faces,
+                           "WeightBones": WeightBones})
+
+    return bytes(w.data)
+
+
+def WriteLmd(filepath, **kwargs):
+    Data = GenerateLmd(**kwargs)
+    with open(filepath, 'wb') as f:
+        f.write(Data)
+    return len(Data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic LMD file")
+    parser.add_argument('output')
+    parser.add_argument('--version', choices=("1.0", "1.2+"), default="1.2+")
+    parser.add_argument('--verts', type=int, default=1000, help="vertices per mesh")
+    parser.add_argument('--faces', type=int, default=1500, help="triangles per mesh")
+    parser.add_argument('--bones', type=int, default=16)
+    parser.add_argument('--materials', type=int, default=2)
+    parser.add_argument('--textures', type=int, default=2)
+    parser.add_argument('--meshes', type=int, default=1)
+    parser.add_argument('--vert-chunk-size', type=lambda x: int(x, 0), default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    Size = WriteLmd(args.output, Version=args.version, VertCount=args.verts, FaceCount=args.faces,
+                    BoneCount=args.bones, MaterialCount=args.materials, TextureCount=args.textures,
+                    MeshCount=args.meshes, VertChunkSize=args.vert_chunk_size, Seed=args.seed)
+    print("Wrote {} ({} bytes)".format(args.output, Size))
+
+
+if __name__ == "__main__":
+    main()
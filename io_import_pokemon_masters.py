@@ -10,117 +10,1000 @@ bl_info = {
     "tracker_url": "https://github.com/MiniEmerald/PokemonMasters",
     "category": "Import-Export"}
 
-import bpy
-import bmesh
 import os
+import sys
 import io
 import struct
 import math
-import mathutils
 import numpy as np
-from bpy.props import (BoolProperty,
-                       FloatProperty,
-                       StringProperty,
-                       EnumProperty,
-                       CollectionProperty
-                       )
-from bpy_extras.io_utils import ImportHelper
 import fnmatch
 import traceback
+import mmap
+import json
+import hashlib
+import bisect
+import multiprocessing
+import concurrent.futures
+import threading
+import queue
+import time
+import zlib
+import logging
+import contextlib
+import urllib.parse
+try:
+    import bpy
+    import mathutils
+    from bpy.props import (BoolProperty,
+                           FloatProperty,
+                           IntProperty,
+                           StringProperty,
+                           EnumProperty,
+                           CollectionProperty
+                           )
+    from bpy_extras.io_utils import ImportHelper
+except ImportError:
+    # Parsing also runs outside of Blender, in the worker processes
+    bpy = None
 
+log = logging.getLogger(__name__)
 
-# To find a file in a path (including subfolders). Thanks Nadia Alramli
-# for the answer from some corner in StackOverflow a decade ago
-def find_file(pattern, path):
-    result = []
-    for root, dirs, files in os.walk(path):
-        for name in files:
-            if fnmatch.fnmatch(name, pattern):
-                result.append(os.path.join(root, name))
-    return result
 
+def cache_directory(name):
+    """Directory for data kept between Blender sessions"""
+    return bpy.utils.user_resource('CONFIG', path=os.path.join('io_import_pokemon_masters', name), create=True)
 
-class PokeMasImport(bpy.types.Operator, ImportHelper):
-    """Load a LMD file"""
-    bl_idname = "import_scene.pokemonmasters"
-    bl_label = "Import"
-    bl_options = {'PRESET', 'UNDO'}
+
+def set_log_level(level):
+    """Print this addon's messages of the given level and above to the console"""
+    if not log.handlers:
+        Handler = logging.StreamHandler(sys.stdout)
+        Handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(Handler)
+        log.propagate = False
+    log.setLevel(level)
+
+
+class ImportProfile:
+    """Nested wall clock timers and counters of an import.
+
+    Phases opened inside another one are timed as its children; running a
+    phase again adds to its time and call count.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.stack = [self.phases]
+        self.start = time.perf_counter()
+
+    @staticmethod
+    def _node(Phases, name):
+        return Phases.setdefault(name, {"seconds": 0.0, "calls": 0, "phases": {}})
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        Node = self._node(self.stack[-1], name)
+        self.stack.append(Node["phases"])
+        Start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Node["seconds"] += time.perf_counter() - Start
+            Node["calls"] += 1
+            self.stack.pop()
+
+    def count(self, name, Amount=1):
+        self.counters[name] = self.counters.get(name, 0) + Amount
+
+    def merge(self, other):
+        """Add the phases and counters of another profile, from a worker process"""
+        def Merge(Into, Phases):
+            for name, Node in Phases.items():
+                Target = self._node(Into, name)
+                Target["seconds"] += Node["seconds"]
+                Target["calls"] += Node["calls"]
+                Merge(Target["phases"], Node["phases"])
+        Merge(self.stack[-1], other.phases)
+        for name, Amount in other.counters.items():
+            self.count(name, Amount)
+
+    def report(self):
+        return {
+            "seconds": time.perf_counter() - self.start,
+            "phases": self.phases,
+            "counters": self.counters,
+        }
+
+    def format(self):
+        Lines = ["Import took {:.3f} s".format(time.perf_counter() - self.start)]
+
+        def Format(Phases, Depth):
+            for name, Node in Phases.items():
+                Lines.append("{}{:<{}} {:>10.1f} ms {:>6}x".format(
+                    '  ' * Depth, name, 28 - 2 * Depth, Node["seconds"] * 1000, Node["calls"]))
+                Format(Node["phases"], Depth + 1)
+        Format(self.phases, 1)
+        Lines.extend("  {:<28} {:>10}".format(name, Amount) for name, Amount in sorted(self.counters.items()))
+        return '\n'.join(Lines)
+
+    def write(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=1)
+
+
+def ContentHash(*Parts):
+    """Hash of arrays, strings, numbers and lists of those, for DatablockRegistry"""
+    Hash = hashlib.blake2b(digest_size=20)
+
+    def Update(Part):
+        if isinstance(Part, np.ndarray):
+            Hash.update("a{}{}|".format(Part.dtype.str, Part.shape).encode('utf-8'))
+            Hash.update(np.ascontiguousarray(Part).tobytes())
+        elif isinstance(Part, (list, tuple)):
+            Hash.update("l{}|".format(len(Part)).encode('utf-8'))
+            for x in Part:
+                Update(x)
+        else:
+            Hash.update("{}{!r}|".format(type(Part).__name__, Part).encode('utf-8'))
+    for Part in Parts:
+        Update(Part)
+    return Hash.hexdigest()
+
+
+class DatablockRegistry:
+    """Imported meshes, armatures and materials by content hash.
+
+    The hash is stored on the datablock as "lmd_hash", so datablocks of
+    earlier sessions are found as well. Lookups go by name and check the
+    hash again, since datablocks get renamed and removed. Only the given
+    Collections are shared, datablocks of the others are never found.
+    """
+    Collections = ('meshes', 'armatures', 'materials')
+
+    def __init__(self, Collections=None):
+        self.names = {x: {} for x in (Collections or self.Collections)}
+        for Collection in self.names:
+            for ID in getattr(bpy.data, Collection):
+                Key = ID.get("lmd_hash")
+                if Key and ID.library is None:
+                    self.names[Collection].setdefault(Key, ID.name)
+
+    def get(self, Collection, Key):
+        if Collection not in self.names:
+            return None
+        ID = getattr(bpy.data, Collection).get(self.names[Collection].get(Key, ""))
+        if ID is not None and ID.get("lmd_hash") == Key:
+            return ID
+        return None
+
+    def add(self, Collection, Key, ID):
+        ID["lmd_hash"] = Key
+        if Collection in self.names:
+            self.names[Collection][Key] = ID.name
+
+
+class TextureIndex:
+    """File name lookup over a directory tree.
+
+    The listing of every directory is kept with its mtime, so refreshing only
+    stats directories and re-lists the ones that changed. Lookups go through
+    a basename index, plus a sorted name list to resolve the "<name>*.png"
+    style fallbacks by prefix.
+    Lookups run on the texture prefetching threads, the lookup tables are
+    replaced all at once so they always see a consistent set.
+    """
+    FormatVersion = 1
+
+    def __init__(self, root):
+        self.root = root
+        self.dirs = {}
+        # Names, sorted names and the os.walk position of every path
+        self.lookup = ({}, [], {})
+
+    def refresh(self):
+        """Re-list directories whose mtime changed, returns whether anything did"""
+        Changed = False
+        Dirs = {}
+        Stack = [self.root]
+        while Stack:
+            Path = Stack.pop()
+            try:
+                MTime = os.stat(Path).st_mtime_ns
+            except OSError:
+                continue
+            Entry = self.dirs.get(Path)
+            if Entry is None or Entry[0] != MTime:
+                Files, SubDirs = [], []
+                try:
+                    with os.scandir(Path) as it:
+                        for e in it:
+                            try:
+                                if e.is_dir():
+                                    # Same as os.walk, symlinked folders aren't followed
+                                    if not e.is_symlink():
+                                        SubDirs.append(e.path)
+                                else:
+                                    Files.append(e.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    pass
+                Entry = (MTime, Files, SubDirs)
+                Changed = True
+            Dirs[Path] = Entry
+            Stack.extend(reversed(Entry[2]))
+
+        Changed |= len(Dirs) != len(self.dirs)
+        self.dirs = Dirs
+        if Changed:
+            self._build()
+        return Changed
+
+    def _build(self):
+        Names = {}
+        Sequence = {}
+        # Directories are stored in os.walk order, so the first hit is the same
+        for Path, (MTime, Files, SubDirs) in self.dirs.items():
+            for Name in Files:
+                FullPath = os.path.join(Path, Name)
+                Names.setdefault(os.path.normcase(Name), []).append(FullPath)
+                Sequence[FullPath] = len(Sequence)
+        self.lookup = (Names, sorted(Names), Sequence)
+
+    def find(self, pattern):
+        Names, SortedNames, Sequence = self.lookup
+        Key = os.path.normcase(pattern)
+        Wildcard = next((i for i, c in enumerate(Key) if c in '*?['), -1)
+        if Wildcard < 0:
+            return list(Names.get(Key, ()))
+        Prefix = Key[:Wildcard]
+        Result = []
+        for i in range(bisect.bisect_left(SortedNames, Prefix), len(SortedNames)):
+            Name = SortedNames[i]
+            if not Name.startswith(Prefix):
+                break
+            if fnmatch.fnmatchcase(Name, Key):
+                Result.extend(Names[Name])
+        return sorted(Result, key=Sequence.get)
+
+    @staticmethod
+    def cache_path(root):
+        return os.path.join(cache_directory('textures'),
+                            hashlib.sha1(root.encode('utf-8', 'surrogateescape')).hexdigest()[:16] + '.json')
+
+    @classmethod
+    def load(cls, root):
+        index = cls(root)
+        try:
+            with open(cls.cache_path(root), 'r', encoding='utf-8') as f:
+                Data = json.load(f)
+            if Data.get('version') == cls.FormatVersion and Data.get('root') == root:
+                index.dirs = {Path: (MTime, Files, SubDirs) for Path, MTime, Files, SubDirs in Data['dirs']}
+                index._build()
+        except (OSError, ValueError, KeyError, TypeError):
+            index.dirs = {}
+        return index
+
+    def save(self):
+        Data = {
+            'version': self.FormatVersion,
+            'root': self.root,
+            'dirs': [[Path, MTime, Files, SubDirs] for Path, (MTime, Files, SubDirs) in self.dirs.items()],
+        }
+        CachePath = self.cache_path(self.root)
+        try:
+            with open(CachePath + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(Data, f)
+            os.replace(CachePath + '.tmp', CachePath)
+        except OSError:
+            log.warning("Couldn't save the texture index of %s", self.root, exc_info=True)
+
+
+# Texture indexes built this session, by root directory
+_TextureIndexes = {}
+
+
+def ResolveTexture(TexIndex, TexFileName):
+    """Path of the file a texture name refers to, or None"""
+    files = TexIndex.find(TexFileName)
+    # Try finding the file by brute force
+    if not files:
+        files = TexIndex.find(TexFileName.replace(".tga", ".ktx.tga"))
+    if not files:
+        files = TexIndex.find(TexFileName.replace(".tga", ".png"))
+    if not files:
+        files = TexIndex.find(TexFileName.replace(".tga", ".ktx.png"))
+    if not files:
+        files = TexIndex.find(TexFileName.replace(".tga", "*.png"))
+    # The game's own textures, decoded by the addon
+    if not files:
+        files = TexIndex.find(TexFileName.replace(".tga", ".ktx"))
+    return files[0] if files else None
+
+
+def GetTextureIndex(root, Persistent=False):
+    """Return the up to date texture index of a directory tree.
+
+    Indexes are kept for the whole session, and with Persistent also saved to
+    disk so the next session starts from the stored listing.
+    """
+    root = os.path.realpath(root)
+    index = _TextureIndexes.get(root)
+    if index is None:
+        index = TextureIndex.load(root) if Persistent else TextureIndex(root)
+        _TextureIndexes[root] = index
+    if index.refresh() and Persistent:
+        index.save()
+    return index
+
+
+class LmdReader:
+    """Random access over a memory-mapped LMD file.
+
+    Offsets in LMD files are mostly stored relative to the field holding them,
+    the helpers below resolve those and return NumPy views into the mapping
+    rather than copies, so arrays handed out must be copied before close().
+    Strings are decoded once per offset and interned, the same bone and
+    material names are referenced from all over a file.
+    """
+    _U32 = struct.Struct('<I')
+
+    def __init__(self, filepath):
+        self.name = filepath
+        with open(filepath, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                self._map = b''
+        self.buffer = memoryview(self._map)
+        self._strings = {}
+        self._string_tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def close(self):
+        try:
+            self.buffer.release()
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+        except BufferError:
+            # Views are still alive, the mapping goes away with them
+            pass
+
+    def u8(self, Offset):
+        return self.buffer[Offset]
+
+    def u32(self, Offset):
+        return self._U32.unpack_from(self.buffer, Offset)[0]
+
+    def uint(self, Offset, Size):
+        return int.from_bytes(self.buffer[Offset:Offset + Size], byteorder='little')
+
+    def pointer(self, Offset):
+        """Resolve an offset stored relative to its own position"""
+        return Offset + self.u32(Offset)
+
+    def pointer_table(self, Offset):
+        """Resolve a count followed by that many relative offsets"""
+        Count = self.u32(Offset)
+        Slots = Offset + 4 + 4 * np.arange(Count, dtype=np.int64)
+        return (Slots + self.array(Offset + 4, '<u4', Count)).tolist()
+
+    def string(self, Offset):
+        """Read a length-prefixed UTF-8 string"""
+        Text = self._strings.get(Offset)
+        if Text is None:
+            Length = self.u32(Offset)
+            Text = sys.intern(str(self.buffer[Offset + 4:Offset + 4 + Length], 'utf-8', 'replace'))
+            self._strings[Offset] = Text
+        return Text
+
+    def string_table(self, Offset):
+        """Strings of a pointer table, resolved once for every chunk sharing it"""
+        Table = self._string_tables.get(Offset)
+        if Table is None:
+            Table = tuple(self.string(x) for x in self.pointer_table(Offset))
+            self._string_tables[Offset] = Table
+        return Table
+
+    def bytes(self, Offset, Size):
+        return self.buffer[Offset:Offset + Size]
+
+    def array(self, Offset, dtype, count):
+        return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=Offset)
+
+
+if bpy is not None:
+    class PokeMasImport(bpy.types.Operator, ImportHelper):
+        """Load a LMD file"""
+        bl_idname = "import_scene.pokemonmasters"
+        bl_label = "Import"
+        bl_options = {'PRESET', 'UNDO'}
     
-    filename_ext = ".wismda"
-    filter_glob: StringProperty(
-            default="*.lmd",
-            options={'HIDDEN'},
-    )
-
-    filepath: StringProperty(subtype='FILE_PATH',)
-    version: EnumProperty(name="Version", items=(("1.0","1.0","1.0"), ("1.2+","1.2+","1.2+")), default="1.2+")
-    removedoubles: BoolProperty(name="Remove Doubles")
-    files: CollectionProperty(type=bpy.types.PropertyGroup)
-
-    def draw(self, context):
-        layout = self.layout
-        layout.separator()
-        layout.prop(self, 'version')
-        #layout.separator()
-        #layout.prop(self,'removedoubles')
-
-    def execute(self, context):
-        print("=====\nLoading file {}".format(self.filepath))
-
-        f = open(self.filepath, "rb")
-        f.seek(0x34)
-        BoneDataOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        ArmatureObject = BuildSkeleton(f, BoneDataOffset)
-        f.seek(0x38)
-        MaterialDataOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        ParseMaterials(f, MaterialDataOffset)
-        
-        f.seek(0x48)
-        MeshCount = int.from_bytes(f.read(4), byteorder='little')
-        MeshList = []
-        for x in range(MeshCount):
-            MeshList.append(f.tell() + int.from_bytes(f.read(4), byteorder='little'))
-        CurMeshOffset = f.tell()
-        print("Loading meshes:")
-        for x in MeshList:
-            ReadMeshChunk(f, x, ArmatureObject, self.version, self.removedoubles)
-
-        f.close()
-        ArmatureObject.rotation_euler = (1.5707963705062866, 0, 0)
-        return {'FINISHED'}
+        filename_ext = ".wismda"
+        filter_glob: StringProperty(
+                default="*.lmd",
+                options={'HIDDEN'},
+        )
+
+        filepath: StringProperty(subtype='FILE_PATH',)
+        version: EnumProperty(name="Version", items=(("1.0","1.0","1.0"), ("1.2+","1.2+","1.2+")), default="1.2+")
+        removedoubles: BoolProperty(
+                name="Remove Doubles",
+                description="Merge vertices split at UV seams when their position and bone weights match",
+        )
+        customnormals: BoolProperty(
+                name="Custom Normals",
+                description="Shade the meshes with the normals stored in the file, "
+                            "otherwise smooth them by angle",
+                default=True,
+        )
+        mergedistance: FloatProperty(
+                name="Merge Distance",
+                description="Maximum distance between merged vertices",
+                default=0.00001, min=0.0, max=0.01, precision=6,
+        )
+        savetextureindex: BoolProperty(
+                name="Save Texture Index",
+                description="Keep the texture folder listing on disk so later sessions don't have to scan it again",
+                default=True,
+        )
+        files: CollectionProperty(type=bpy.types.PropertyGroup)
+        directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN'})
+        importfolder: BoolProperty(
+                name="Whole Folder",
+                description="Import every LMD file in the folder and its subfolders",
+        )
+        cache: EnumProperty(
+                name="Cache",
+                items=(('USE', "Use", "Reuse the parsed data of files imported before"),
+                       ('BYPASS', "Bypass", "Parse every file again without reading or writing the cache"),
+                       ('CLEAR', "Clear", "Empty the cache, then parse and store every file again")),
+                default='USE',
+        )
+        cachesize: IntProperty(
+                name="Cache Size (MB)",
+                description="Least recently used files are dropped from the cache above this size",
+                default=2048,
+                min=0,
+        )
+        processes: IntProperty(
+                name="Processes",
+                description="Worker processes parsing files in parallel, 0 uses one per CPU core",
+                default=0,
+                min=0,
+        )
+        meshinclude: StringProperty(
+                name="Include Meshes",
+                description="Only import meshes whose name matches one of these comma separated patterns, e.g. *body*",
+        )
+        meshexclude: StringProperty(
+                name="Exclude Meshes",
+                description="Skip meshes whose name matches one of these comma separated patterns, e.g. *shadow*",
+        )
+        share: BoolProperty(
+                name="Share Identical Data",
+                description="Reuse the meshes, armatures and materials of identical ones imported before "
+                            "instead of creating copies",
+                default=True,
+        )
+        proxy: BoolProperty(
+                name="Proxy Meshes",
+                description="Create placeholders instead of meshes, to load later with Object > Load LMD Proxy Meshes",
+        )
+        loglevel: EnumProperty(
+                name="Console Output",
+                items=(('WARNING', "Warnings", "Only print problems"),
+                       ('INFO', "Files", "Print a line for every file, mesh and timing summary"),
+                       ('DEBUG', "Everything", "Also print every texture, material slot and weight bone")),
+                default='INFO',
+        )
+        profilepath: StringProperty(
+                name="Profile Report",
+                description="Write the time spent in every import phase as JSON to this file",
+                subtype='FILE_PATH',
+        )
+        reload: BoolProperty(
+                name="Reload",
+                description="Update the objects of files imported before in place instead of adding copies, "
+                            "only rebuilding the meshes that changed",
+        )
+        watch: BoolProperty(
+                name="Watch Files",
+                description="Reload the files whenever they change on disk, "
+                            "until Object > Stop Watching LMD Files",
+        )
+        background: BoolProperty(
+                name="Background Import",
+                description="Import with a progress bar, the viewport can be navigated and the rest of Blender "
+                            "is locked until the import ends. Esc cancels, keeping the files already imported "
+                            "(needs Blender 3.2 or later)",
+        )
+
+        def draw(self, context):
+            layout = self.layout
+            layout.separator()
+            layout.prop(self, 'version')
+            layout.prop(self, 'savetextureindex')
+            layout.prop(self, 'importfolder')
+            layout.prop(self, 'processes')
+            layout.prop(self, 'background')
+            layout.prop(self, 'cache')
+            layout.prop(self, 'cachesize')
+            layout.prop(self, 'loglevel')
+            layout.prop(self, 'profilepath')
+            layout.separator()
+            layout.prop(self, 'customnormals')
+            layout.prop(self, 'removedoubles')
+            row = layout.row()
+            row.enabled = self.removedoubles
+            row.prop(self, 'mergedistance')
+            layout.separator()
+            layout.prop(self, 'meshinclude')
+            layout.prop(self, 'meshexclude')
+            layout.prop(self, 'proxy')
+            layout.prop(self, 'share')
+            layout.separator()
+            layout.prop(self, 'reload')
+            layout.prop(self, 'watch')
+
+        def selected_files(self):
+            directory = self.directory or os.path.dirname(self.filepath)
+            if self.importfolder:
+                result = []
+                for root, dirs, files in os.walk(directory):
+                    dirs.sort()
+                    result.extend(os.path.join(root, x) for x in sorted(files) if x.lower().endswith(".lmd"))
+                return result
+            names = [x.name for x in self.files if x.name]
+            if names:
+                return [os.path.join(directory, x) for x in names]
+            return [self.filepath] if os.path.isfile(self.filepath) else []
+
+        def execute(self, context):
+            filepaths = self.selected_files()
+            if not filepaths:
+                self.report({'ERROR'}, "No LMD file selected")
+                return {'CANCELLED'}
+            set_log_level(self.loglevel)
+            Cache = Textures = None
+            if self.cache != 'BYPASS':
+                Cache = ModelCache(cache_directory('models'), self.cachesize * 1024 ** 2)
+                Textures = TextureCache(cache_directory('ktx'), self.cachesize * 1024 ** 2)
+                if self.cache == 'CLEAR':
+                    Cache.clear()
+                    Textures.clear()
+
+            Selection = MeshSelection(self.meshinclude, self.meshexclude, self.proxy)
+            Registry = DatablockRegistry() if self.share else None
+            MergeDistance = self.mergedistance if self.removedoubles else None
+            Options = dict(Version=self.version, Processes=self.processes, Cache=Cache, TextureCache=Textures,
+                           Selection=Selection, Registry=Registry, SaveTextureIndex=self.savetextureindex,
+                           MergeDistance=MergeDistance, CustomNormals=self.customnormals)
+            if self.watch:
+                _Watcher.watch(filepaths, Options)
+            Job = ImportJob(filepaths, Reload=self.reload, **Options)
+
+            # Operators only run from timers with a context override
+            if self.background and hasattr(context, 'temp_override'):
+                Window = context.window
+
+                def Tick():
+                    try:
+                        with bpy.context.temp_override(window=Window):
+                            return 0.01 if Job.tick() else None
+                    except ReferenceError:
+                        # The window was closed
+                        Job.cancel()
+                        return None
+
+                self.job = Job
+                Job.start()
+                bpy.app.timers.register(Tick)
+                self.timer = context.window_manager.event_timer_add(0.1, window=Window)
+                context.window_manager.progress_begin(0, 1)
+                context.window_manager.modal_handler_add(self)
+                return {'RUNNING_MODAL'}
+
+            Job.run()
+            return self.finish(Job)
+
+        PassThroughEvents = {'TIMER', 'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'MIDDLEMOUSE', 'WHEELUPMOUSE',
+                             'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM', 'NDOF_MOTION', 'WINDOW_DEACTIVATE'}
+
+        def modal(self, context, event):
+            Job = self.job
+            if event.type == 'ESC':
+                Job.cancel()
+            if Job.finished:
+                context.window_manager.event_timer_remove(self.timer)
+                context.window_manager.progress_end()
+                context.workspace.status_text_set(None)
+                return self.finish(Job)
+            if event.type == 'TIMER':
+                context.window_manager.progress_update(Job.progress)
+                context.workspace.status_text_set(Job.status())
+            # Only let the view be navigated, editing or undoing would pull the objects being built away
+            return {'PASS_THROUGH'} if event.type in self.PassThroughEvents else {'RUNNING_MODAL'}
+
+        def finish(self, Job):
+            Profile = Job.profile
+            log.info(Profile.format())
+            if self.profilepath:
+                try:
+                    Profile.write(bpy.path.abspath(self.profilepath))
+                except OSError as e:
+                    self.report({'WARNING'}, "Couldn't write the profile report: {}".format(e))
+
+            filepaths = Job.filepaths
+            # Finished even when cancelled, so the files already imported can be undone
+            if Job.error is not None:
+                self.report({'ERROR'}, "Import failed after {} of {} files, see the console".format(
+                    Job.done, len(filepaths)))
+            elif Job.cancelled.is_set():
+                self.report({'WARNING'}, "Import cancelled after {} of {} files".format(Job.done, len(filepaths)))
+            elif Job.failed:
+                self.report({'WARNING'}, "{} of {} files failed to load, see the console".format(
+                    Job.failed, len(filepaths)))
+            elif self.removedoubles:
+                self.report({'INFO'}, "Imported {} file{} in {:.2f} s, removed {} of {} vertices".format(
+                    len(filepaths), '' if len(filepaths) == 1 else 's', Profile.report()["seconds"],
+                    Job.verts_before - Job.verts_after, Job.verts_before))
+            else:
+                self.report({'INFO'}, "Imported {} file{} in {:.2f} s".format(
+                    len(filepaths), '' if len(filepaths) == 1 else 's', Profile.report()["seconds"]))
+            return {'FINISHED'}
         
-    def invoke(self, context, event):
-        context.window_manager.fileselect_add(self)
-        return {'RUNNING_MODAL'}
+        def invoke(self, context, event):
+            context.window_manager.fileselect_add(self)
+            return {'RUNNING_MODAL'}
 
 
-def ReadMeshChunk(f, StartAddr, ArmatureObject, Version, RemoveDoubles=False):
-    f.seek(StartAddr + 7)
-    VertChunkSize = int.from_bytes(f.read(1), byteorder='little')
-    
-    f.seek(StartAddr + 0x8)
-    ModelNameArea = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-    f.seek(ModelNameArea)
-    ModelNameLength = int.from_bytes(f.read(4), byteorder='little')
-    ModelName = f.read(ModelNameLength).decode('utf-8', 'replace')
+    class PokeMasLoadProxies(bpy.types.Operator):
+        """Decode the meshes of the selected LMD proxies, or of every proxy when none is selected"""
+        bl_idname = "object.pokemonmasters_load_proxies"
+        bl_label = "Load LMD Proxy Meshes"
+        bl_options = {'REGISTER', 'UNDO'}
+
+        @staticmethod
+        def proxies(context):
+            def Proxies(Objects):
+                return [x for x in Objects if x.type == 'EMPTY' and "lmd_mesh_offset" in x]
+            return Proxies(context.selected_objects) or Proxies(context.scene.objects)
+
+        @classmethod
+        def poll(cls, context):
+            return context.mode == 'OBJECT' and bool(cls.proxies(context))
+
+        def execute(self, context):
+            Proxies = self.proxies(context)
+            try:
+                Built = LoadProxyMeshes(Proxies, Registry=DatablockRegistry())
+            except OSError as e:
+                self.report({'ERROR'}, "Couldn't read the LMD file: {}".format(e))
+                return {'CANCELLED'}
+            self.report({'INFO'}, "Loaded {} mesh{}".format(len(Built), '' if len(Built) == 1 else 'es'))
+            return {'FINISHED'}
+
+
+    class PokeMasStopWatching(bpy.types.Operator):
+        """Stop reloading LMD files when they change on disk"""
+        bl_idname = "object.pokemonmasters_stop_watching"
+        bl_label = "Stop Watching LMD Files"
+
+        @classmethod
+        def poll(cls, context):
+            return bool(_Watcher.files)
+
+        def execute(self, context):
+            Count = len(_Watcher.files)
+            _Watcher.stop()
+            self.report({'INFO'}, "Stopped watching {} file{}".format(Count, '' if Count == 1 else 's'))
+            return {'FINISHED'}
+
+
+def VertexDtype(VertChunkSize, Version):
+    """Structured dtype of one vertex record.
+
+    Every position is followed by a packed normal, 1.0 files may then carry
+    a RGBA8 color and store weights as normalized ushorts, 1.2+ files store
+    float weights.
+    """
+    bHasColor = (VertChunkSize >= 0x24) and (Version == "1.0")
+    Names = ['Position', 'Normal']
+    Formats = ['<3f4', '4u1']
+    Offsets = [0, 12]
+    Offset = 16
+    if bHasColor:
+        Names.append('Color')
+        Formats.append('4u1')
+        Offsets.append(Offset)
+        Offset += 4
+    Names.append('UV')
+    Formats.append('<2f2')
+    Offsets.append(Offset)
+    Offset += 4
+    if bHasColor:
+        Offset += VertChunkSize - 0x24
+    Names.append('BoneIndex')
+    Formats.append('4u1')
+    Offsets.append(Offset)
+    Offset += 4
+    Names.append('Weight')
+    Offsets.append(Offset)
+    if Version == "1.0":
+        Formats.append('<4u2')
+        Offset += 2 * 4
+    else:
+        Formats.append('<4f4')
+        Offset += 4 * 4
+    return np.dtype({'names': Names, 'formats': Formats, 'offsets': Offsets, 'itemsize': Offset})
+
+
+def VertexStride(VertChunkSize, Version):
+    return VertexDtype(VertChunkSize, Version).itemsize
+
+
+def DecodeVertexBuffer(Buffer, VertCount, VertChunkSize, Version):
+    """Decode a whole vertex block at once.
+
+    Returns contiguous (positions, normals, uvs, colors, bone indices,
+    weights) arrays, colors being None when the layout has none.
+    """
+    Verts = np.frombuffer(Buffer, dtype=VertexDtype(VertChunkSize, Version), count=VertCount)
+    Positions = np.ascontiguousarray(Verts['Position'], dtype=np.float32)
+    Normals = DecodePackedNormals(np.ascontiguousarray(Verts['Normal']))
+    UVs = Verts['UV'].astype(np.float32)
+    UVs[:, 1] = 1 - UVs[:, 1]
+    Colors = None
+    if 'Color' in Verts.dtype.names:
+        Colors = Verts['Color'].astype(np.float32) / 255
+    BoneIndices = np.ascontiguousarray(Verts['BoneIndex'])
+    if Version == "1.0":
+        Weights = Verts['Weight'].astype(np.float32) / 65535
+    else:
+        Weights = np.ascontiguousarray(Verts['Weight'], dtype=np.float32)
+    return Positions, Normals, UVs, Colors, BoneIndices, Weights
+
+
+def DecodePackedNormals(Packed):
+    """Unit normals of (N, 4) packed byte normals, the fourth byte is unused.
+
+    Both signed and unsigned normalized bytes are tried, keeping whichever
+    decodes to unit vectors. Unset, all zero normals stay zero.
+    """
+    Signed = Packed[:, :3].view(np.int8).astype(np.float32) / 127
+    Unsigned = Packed[:, :3].astype(np.float32) / 127.5 - 1
+    Unset = ~Packed[:, :3].any(axis=1)
+    Normals = Signed
+    if not Unset.all():
+        Error = [np.median(np.abs(np.linalg.norm(x[~Unset], axis=1) - 1)) for x in (Signed, Unsigned)]
+        if Error[1] < Error[0]:
+            Normals = Unsigned
+    Lengths = np.linalg.norm(Normals, axis=1, keepdims=True)
+    Normals /= np.where(Lengths > 0, Lengths, 1)
+    Normals[Unset] = 0
+    return Normals
+
+
+def DecodeFaceBuffer(Buffer, FaceCount, FSize):
+    """Decode a triangle list of 1, 2 or 4 byte indices into an (N, 3) array"""
+    Indices = np.frombuffer(Buffer, dtype='<u{}'.format(FSize), count=(FaceCount // 3) * 3)
+    return Indices.astype(np.int32).reshape(-1, 3)
+
+
+def CleanFaceIndices(Faces, VertCount):
+    """Indices of the triangles bmesh keeps: in range, not degenerate, not repeated"""
+    Valid = (Faces < VertCount).all(axis=1) & (Faces >= 0).all(axis=1)
+    Valid &= (Faces[:, 0] != Faces[:, 1]) & (Faces[:, 1] != Faces[:, 2]) & (Faces[:, 0] != Faces[:, 2])
+    Indices = np.flatnonzero(Valid)
+    # Same vertex set in any winding counts as the same face
+    _, First = np.unique(np.sort(Faces[Indices], axis=1), axis=0, return_index=True)
+    return Indices[np.sort(First)]
+
+
+def CleanFaces(Faces, VertCount):
+    """Drop the triangles bmesh used to reject: out of range, degenerate or repeated"""
+    return Faces[CleanFaceIndices(Faces, VertCount)]
+
+
+def SkinKeys(BoneIndices, Weights):
+    """Integer id per vertex, equal for vertices with the same bone influences"""
+    Quantized = np.rint(np.clip(Weights, 0, 1) * 65535).astype(np.int64)
+    Slots = np.where(Quantized > 0, (BoneIndices.astype(np.int64) + 1) << 16 | Quantized, 0)
+    # Slot order doesn't matter
+    Slots = np.ascontiguousarray(np.sort(Slots, axis=1))
+    _, Keys = np.unique(Slots.view('V{}'.format(Slots.shape[1] * 8)).ravel(), return_inverse=True)
+    return Keys.ravel()
+
+
+def WeldVertices(Positions, BoneIndices, Weights, Distance):
+    """Find the vertices to merge, like bmesh's remove doubles.
+
+    Vertices merge when they are within Distance of each other and have the
+    same bone influences, so skinning is unchanged. Candidates are found with
+    a spatial hash over a grid of Distance sized cells; only the 27 cells
+    around each vertex are compared. Chains of close vertices merge into one.
+    Returns the indices of the vertices kept and the new index of every vertex.
+    """
+    Count = len(Positions)
+    if not Count:
+        return np.arange(0), np.arange(0)
+    Skin = SkinKeys(BoneIndices, Weights)
+    Cells = np.floor(Positions / max(Distance, 1e-12)).astype(np.int64)
+
+    def Hash(Cells):
+        # Wraps around on overflow, collisions are filtered by the checks below
+        return (Cells[:, 0] * 73856093) ^ (Cells[:, 1] * 19349663) ^ (Cells[:, 2] * 83492791) ^ (Skin * 2654435761)
+
+    Keys = Hash(Cells)
+    Order = np.argsort(Keys, kind='stable')
+    CellKeys, CellStarts, CellSizes = np.unique(Keys[Order], return_index=True, return_counts=True)
+
+    PairsA, PairsB = [], []
+    for Offset in np.ndindex(3, 3, 3):
+        Neighbours = Hash(Cells + (np.array(Offset) - 1))
+        Cell = np.minimum(np.searchsorted(CellKeys, Neighbours), len(CellKeys) - 1)
+        bOccupied = CellKeys[Cell] == Neighbours
+        Lo = CellStarts[Cell]
+        Counts = np.where(bOccupied, CellSizes[Cell], 0)
+        if not Counts.any():
+            continue
+        A = np.repeat(np.arange(Count), Counts)
+        B = Order[np.repeat(Lo - np.cumsum(Counts) + Counts, Counts) + np.arange(Counts.sum())]
+        Keep = (A < B) & (Skin[A] == Skin[B])
+        A, B = A[Keep], B[Keep]
+        Keep = ((Positions[A] - Positions[B]) ** 2).sum(axis=1) <= Distance * Distance
+        PairsA.append(A[Keep])
+        PairsB.append(B[Keep])
+
+    # Connected components, every vertex ends up labelled with the lowest index in its group
+    Labels = np.arange(Count)
+    A, B = np.concatenate(PairsA or [Labels[:0]]), np.concatenate(PairsB or [Labels[:0]])
+    while len(A):
+        Previous = Labels.copy()
+        Lowest = np.minimum(Labels[A], Labels[B])
+        np.minimum.at(Labels, A, Lowest)
+        np.minimum.at(Labels, B, Lowest)
+        Labels = Labels[Labels]
+        if np.array_equal(Labels, Previous):
+            break
+
+    bKept = Labels == np.arange(Count)
+    Remap = (np.cumsum(bKept) - 1)[Labels]
+    return np.flatnonzero(bKept), Remap
+
+
+def BuildMeshData(mesh, Positions, Faces, LoopUVs, LoopColors=None, Profile=None):
+    """Fill an empty mesh with triangles and per-loop UVs and colors in bulk"""
+    Profile = Profile or ImportProfile()
+    FaceCount = len(Faces)
+    LoopVerts = Faces.ravel()
+
+    with Profile.phase("geometry"):
+        BuildGeometry(mesh, Positions, LoopVerts, FaceCount)
+
+    with Profile.phase("uv_color"):
+        BuildLoopLayers(mesh, LoopUVs, LoopColors)
+
+
+def BuildGeometry(mesh, Positions, LoopVerts, FaceCount):
+
+    mesh.vertices.add(len(Positions))
+    mesh.vertices.foreach_set("co", Positions.ravel())
+    mesh.loops.add(len(LoopVerts))
+    mesh.loops.foreach_set("vertex_index", LoopVerts)
+    mesh.polygons.add(FaceCount)
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(LoopVerts), 3, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_total", np.full(FaceCount, 3, dtype=np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.ones(FaceCount, dtype=bool))
+    mesh.update(calc_edges=True)
+
+
+def BuildLoopLayers(mesh, LoopUVs, LoopColors=None):
+    uv_layer = mesh.uv_layers.new()
+    uv_layer.data.foreach_set("uv", LoopUVs.ravel())
+
+    if LoopColors is not None:
+        ColorRGB = LoopColors.copy()
+        ColorRGB[:, 3] = 1
+        ColorAlpha = np.repeat(LoopColors[:, 3:], 4, axis=1)
+        ColorAlpha[:, 3] = 1
+        mesh.vertex_colors.new(name="Color").data.foreach_set("color", ColorRGB.ravel())
+        mesh.vertex_colors.new(name="Color_ALPHA").data.foreach_set("color", ColorAlpha.ravel())
+
+
+def GroupWeights(BoneIndices, Weights, BoneCount):
+    """Group vertex influences by weight bone and quantized weight.
+
+    Returns a list of (bone index, weight, vertex indices) batches and the
+    sorted array of bone indices that fall outside the weight bone table
+    along with how many influences referenced them.
+    """
+    Verts, Slots = np.nonzero(Weights)
+    Bones = BoneIndices[Verts, Slots].astype(np.int64)
+    Values = Weights[Verts, Slots].astype(np.float64)
+
+    Valid = Bones < BoneCount
+    BadBones, BadCounts = np.unique(Bones[~Valid], return_counts=True)
+    Verts, Bones, Values = Verts[Valid], Bones[Valid], Values[Valid]
+
+    # A vertex can name the same bone in several slots, sum those first
+    Keys, Inverse = np.unique(Verts * BoneCount + Bones, return_inverse=True)
+    Values = np.bincount(Inverse.ravel(), weights=Values, minlength=len(Keys))
+    Verts, Bones = Keys // BoneCount, Keys % BoneCount
+
+    Quantized = np.rint(Values * 65535).astype(np.int64)
+    Order = np.lexsort((Verts, Quantized, Bones))
+    Verts, Bones, Quantized, Values = Verts[Order], Bones[Order], Quantized[Order], Values[Order]
+    Splits = np.flatnonzero((np.diff(Bones) != 0) | (np.diff(Quantized) != 0)) + 1
+
+    Batches = []
+    for Start, End in zip(np.concatenate(([0], Splits)), np.concatenate((Splits, [len(Verts)]))):
+        if Start == End:
+            continue
+        Batches.append((int(Bones[Start]), float(Values[Start]), Verts[Start:End]))
+    return Batches, BadBones, BadCounts
+
+
+def AssignVertexGroups(obj, WeightBoneTable, BoneIndices, Weights, WeightBoneIDs=None):
+    """Add the weights of a mesh as vertex groups named after their bones.
+
+    With the skeleton index of every weight bone table entry, entries of the
+    same bone are merged into one group by index before any is created.
+    """
+    Count = len(WeightBoneTable)
+    Names = WeightBoneTable
+    if WeightBoneIDs is not None and Count:
+        # Bones missing from the skeleton keep a group per table entry
+        Keys = np.where(WeightBoneIDs >= 0, WeightBoneIDs, -1 - np.arange(Count))
+        Unique, First, Inverse = np.unique(Keys, return_index=True, return_inverse=True)
+        # Groups are created in table order
+        Order = np.argsort(First)
+        Rank = np.empty_like(Order)
+        Rank[Order] = np.arange(len(Order))
+        Inverse = Rank[Inverse.ravel()]
+        Names = [WeightBoneTable[x] for x in First[Order]]
+        # Indices past the table stay past it, for the warning below
+        BoneIndices = BoneIndices.astype(np.int64)
+        BoneIndices = np.where(BoneIndices < Count, Inverse[np.minimum(BoneIndices, Count - 1)],
+                               BoneIndices - Count + len(Unique))
+    Batches, BadBones, BadCounts = GroupWeights(BoneIndices, Weights, len(Names))
+    if len(BadBones):
+        BadBones = BadBones - len(Names) + Count
+        log.warning(" WEIGHT FAIL: %d influence%s on %d bone ind%s outside the %d entry weight bone table: %s",
+                    BadCounts.sum(), '' if BadCounts.sum() == 1 else 's',
+                    len(BadBones), 'ex' if len(BadBones) == 1 else 'ices',
+                    Count, ', '.join(str(x) for x in BadBones))
+
+    VertexGroups = {}
+    for Bone, Weight, Verts in Batches:
+        TempVG = VertexGroups.get(Bone)
+        if TempVG is None:
+            TempVG = obj.vertex_groups.get(Names[Bone]) or obj.vertex_groups.new(name=Names[Bone])
+            VertexGroups[Bone] = TempVG
+        TempVG.add(Verts.tolist(), Weight, 'ADD')
+
+
+def ReadMeshHeader(lmd, StartAddr):
+    """Name, material, counts and buffer offsets of a mesh chunk, without decoding its buffers"""
+    VertChunkSize = lmd.u8(StartAddr + 7)
+    ModelName = lmd.string(lmd.pointer(StartAddr + 0x8))
 
     #Get Material Name
-    f.seek(StartAddr + 0x14)
-    MaterialNameOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-    f.seek(MaterialNameOffset + 8)
-    MaterialNameSize = int.from_bytes(f.read(4), byteorder='little')
-    MaterialNameText = f.read(MaterialNameSize).decode('utf-8', 'replace')
-    
-    f.seek(StartAddr + 0x58)
-    WeightBoneNameTableStart = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-    
-    f.seek(StartAddr + 0x5C)
-    WeightBoneTableStart = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-    
-    f.seek(StartAddr + 0x78)
-    FaceCount = int.from_bytes(f.read(4), byteorder='little')
-    f.seek(StartAddr + 0x84)
-    VertCount = int.from_bytes(f.read(4), byteorder='little')
+    MaterialNameText = lmd.string(lmd.pointer(StartAddr + 0x14) + 8)
+
+    FaceCount = lmd.u32(StartAddr + 0x78)
+    VertCount = lmd.u32(StartAddr + 0x84)
     SizeTest = VertCount * VertChunkSize
     if SizeTest < 0x100:
         Size = 1
@@ -128,60 +1011,23 @@ def ReadMeshChunk(f, StartAddr, ArmatureObject, Version, RemoveDoubles=False):
         Size = 2
     else:
         Size = 4
-    f.seek(8, 1)
-    VertSize = int.from_bytes(f.read(Size), byteorder='little')
-    VertOffset = f.tell()
-    
-    #Read Vert Info Here
-    VertTable = []
-    UVTable = []
-    VGData = []
-    ColorData = []
-    AlphaData = []
-    bHasColor = False
-    for x in range(VertCount):
-        TempVert = struct.unpack('fff', f.read(4*3))
-        f.seek(4, 1)
-        if (VertChunkSize >= 0x24) & (Version == "1.0"):
-            bHasColor = True
-            TempColor = struct.unpack('4B', f.read(4))
-            ColorData.append((TempColor[0] / 255, TempColor[1] / 255, TempColor[2] / 255))
-            AlphaData.append((TempColor[3] / 255, TempColor[3] / 255, TempColor[3] / 255))
-        TempUV = (np.fromstring(f.read(2), dtype='<f2'), 1-np.fromstring(f.read(2), dtype='<f2'))
-        if (VertChunkSize >= 0x24) & (Version == "1.0"):
-            f.seek(VertChunkSize - 0x24, 1)
-        VGBone = (
-            int.from_bytes(f.read(1), byteorder='little'),
-            int.from_bytes(f.read(1), byteorder='little'),
-            int.from_bytes(f.read(1), byteorder='little'),
-            int.from_bytes(f.read(1), byteorder='little')
-        )
-        if Version == "1.0":
-            VGWeight = (
-                int.from_bytes(f.read(2), byteorder='little') / 65535,
-                int.from_bytes(f.read(2), byteorder='little') / 65535,
-                int.from_bytes(f.read(2), byteorder='little') / 65535,
-                int.from_bytes(f.read(2), byteorder='little') / 65535
-            )
-        else:
-            VGWeight = struct.unpack('ffff', f.read(4 * 4))
-        VGData.append((x, VGBone, VGWeight))
-        VertTable.append(TempVert)
-        UVTable.append(TempUV)
-        
+    VertSize = lmd.uint(StartAddr + 0x90, Size)
+    VertOffset = StartAddr + 0x90 + Size
+
     if Size == 1: UnknownSize = 2
     else: UnknownSize = 4
-    f.seek(VertOffset + VertSize + Size + UnknownSize)
-    UnknownCount = int.from_bytes(f.read(4), byteorder='little')
-    f.seek(0x10 * UnknownCount, 1)
-    SizeTest = int.from_bytes(f.read(4), byteorder='little')
+    Offset = VertOffset + VertSize + Size + UnknownSize
+    UnknownCount = lmd.u32(Offset)
+    Offset += 4 + 0x10 * UnknownCount
+    SizeTest = lmd.u32(Offset)
+    Offset += 4
     if FaceCount < 0x100:
         Size = 1
     elif FaceCount < 0x10000:
         Size = 2
     else:
         Size = 4
-    FaceSize = int.from_bytes(f.read(Size), byteorder='little')
+    FaceSize = lmd.uint(Offset, Size)
     if VertCount < 0x100:
         FSize = 1
     elif VertCount < 0x10000:
@@ -189,318 +1035,2045 @@ def ReadMeshChunk(f, StartAddr, ArmatureObject, Version, RemoveDoubles=False):
     else:
         FSize = 4
     #FaceCount = int(FaceSize / FSize)
-    FaceOffset = f.tell()
-    
+    FaceOffset = Offset + Size
+
+    return {
+        "Name": ModelName,
+        "Material": MaterialNameText,
+        "Offset": StartAddr,
+        "Size": FaceOffset + (FaceCount // 3) * 3 * FSize - StartAddr,
+        "VertChunkSize": VertChunkSize,
+        "VertCount": VertCount,
+        "FaceCount": FaceCount,
+        "VertOffset": VertOffset,
+        "FaceOffset": FaceOffset,
+        "FSize": FSize,
+    }
+
+
+def ReadMeshChunk(lmd, StartAddr, Version, BoneIDs=None):
+    """Decode a mesh chunk, BoneIDs maps bone names to their skeleton index, see SkeletonBoneIDs"""
+    Header = ReadMeshHeader(lmd, StartAddr)
+    VertChunkSize, VertCount, FaceCount = Header["VertChunkSize"], Header["VertCount"], Header["FaceCount"]
+    WeightBoneNameTableStart = lmd.pointer(StartAddr + 0x58)
+
+    #Read Vert Info Here
+    Positions, Normals, UVs, Colors, BoneIndices, Weights = DecodeVertexBuffer(
+        lmd.bytes(Header["VertOffset"], VertCount * VertexStride(VertChunkSize, Version)),
+        VertCount, VertChunkSize, Version)
+
     #Read Faces
-    FaceTable = []
-    for x in range(0,FaceCount,3):
-        FaceTable.append((
-            int.from_bytes(f.read(FSize), byteorder='little'),
-            int.from_bytes(f.read(FSize), byteorder='little'),
-            int.from_bytes(f.read(FSize), byteorder='little')
-        ))
-        
+    FSize = Header["FSize"]
+    FaceBuffer = lmd.bytes(Header["FaceOffset"], (FaceCount // 3) * 3 * FSize)
+    Faces = CleanFaces(DecodeFaceBuffer(FaceBuffer, FaceCount, FSize), VertCount)
+
     #GetWeight Paint Names
-    WeightBoneTable = []
-    f.seek(WeightBoneNameTableStart)
-    WeightBoneCount = int.from_bytes(f.read(4), byteorder='little')
-
-    for x in range(WeightBoneCount):
-        f.seek(WeightBoneNameTableStart + x*4 + 4)
-        WeightBoneNameOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        f.seek(WeightBoneNameOffset)
-        WeightBoneNameSize = int.from_bytes(f.read(4), byteorder='little')
-        WeightBoneName = f.read(WeightBoneNameSize).decode('utf-8', 'replace')
-        WeightBoneTable.append(WeightBoneName)
-        print('{}: {}'.format(WeightBoneName, WeightBoneNameOffset))
-    
-    #Build Mesh
-    mesh1 = bpy.data.meshes.new("mesh")
-    mesh1.use_auto_smooth = True
-    obj = bpy.data.objects.new(ModelName, mesh1)
+    WeightBoneTable = lmd.string_table(WeightBoneNameTableStart)
+    if BoneIDs is None:
+        BoneIDs = SkeletonBoneIDs(ReadSkeleton(lmd, lmd.pointer(0x34)))
+    # Bones missing from the skeleton are -1
+    WeightBoneIDs = np.array([BoneIDs.get(x, -1) for x in WeightBoneTable], dtype=np.int32)
+
+    return {
+        "Name": Header["Name"],
+        "Material": Header["Material"],
+        "Offset": StartAddr,
+        "Positions": Positions,
+        "Normals": Normals,
+        "Faces": Faces,
+        "UVs": UVs,
+        "Colors": Colors,
+        "BoneIndices": BoneIndices,
+        "Weights": Weights,
+        "WeightBones": list(WeightBoneTable),
+        "WeightBoneIDs": WeightBoneIDs,
+    }
+
+
+class MeshSelection:
+    """Which mesh chunks of a file to import, by name.
+
+    Patterns are fnmatch style and separated by commas. A mesh is selected
+    when it matches an include pattern (or there are none) and no exclude
+    pattern. In proxy mode selected meshes are imported as placeholders and
+    only decoded later, so none is decoded while parsing.
+    """
+
+    def __init__(self, Include="", Exclude="", Proxy=False):
+        self.include = [x.strip() for x in Include.split(',') if x.strip()]
+        self.exclude = [x.strip() for x in Exclude.split(',') if x.strip()]
+        self.proxy = Proxy
+
+    def selected(self, Name):
+        if self.include and not any(fnmatch.fnmatchcase(Name, x) for x in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(Name, x) for x in self.exclude)
+
+    def decode(self, Name):
+        return not self.proxy and self.selected(Name)
+
+
+def MeshObject(Name, mesh, ArmatureObject):
+    obj = bpy.data.objects.new(Name, mesh)
+    # Blender may rename the object, reloading matches the chunk name
+    obj["lmd_mesh_name"] = Name
     bpy.context.scene.collection.objects.link(obj)
     bpy.context.view_layer.objects.active = obj
     obj.select_set(True) 
-    mesh = bpy.context.object.data
-    bm = bmesh.new()
-    for v in VertTable:
-        bm.verts.new((v[0], v[1], v[2]))
-    vlist = [v for v in bm.verts]
-    for face in FaceTable:
-        try:
-            bm.faces.new((vlist[face[0]], vlist[face[1]], vlist[face[2]]))
-        except:
-            continue
-    print('- {}: {} - {}'.format(ModelName, MaterialNameText, len(vlist)))
+    Arm = obj.modifiers.new("Armature", "ARMATURE")
+    Arm.object = ArmatureObject
+    obj.parent = ArmatureObject
+    return obj
 
-    bm.to_mesh(mesh)
 
-    uv_layer = bm.loops.layers.uv.verify()
-    for face in bm.faces:
-        face.smooth = True
-        for l in face.loops:
-            luv = l[uv_layer]
-            try:
-                luv.uv = UVTable[l.vert.index]
-            except:
-                continue
-    bm.to_mesh(mesh)
-    mesh.auto_smooth_angle = 1.2
-    # if RemoveDoubles:
-    #     bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=0.00001)
-    #     bm.to_mesh(mesh)
-    #     mesh.validate(verbose=True)
-    #     mesh.update()
+def BuildMesh(Mesh, ArmatureObject, MergeDistance=None, Profile=None, Material=None, Registry=None,
+              bCustomNormals=True):
+    """Mesh object of a decoded chunk, sharing the mesh of an identical one already imported"""
+    Profile = Profile or ImportProfile()
+    if Material is None:
+        Material = bpy.data.materials.get(Mesh["Material"])
+    for WeightBoneName in Mesh["WeightBones"]:
+        log.debug(WeightBoneName)
+
+    with Profile.phase("hash"):
+        Key = MeshHash(Mesh, MergeDistance, Material, bCustomNormals)
+    if Registry is not None:
+        mesh = Registry.get('meshes', Key)
+        if mesh is not None:
+            obj = MeshObject(Mesh["Name"], mesh, ArmatureObject)
+            # Before 3.0 vertex group names belong to the object, not the mesh
+            if not obj.vertex_groups:
+                RestoreVertexGroups(obj, mesh)
+            log.info('- %s: %s - shared with %s', Mesh["Name"], Mesh["Material"], mesh.name)
+            Profile.count("shared_meshes")
+            return obj
+
+    #Build Mesh
+    mesh = bpy.data.meshes.new("mesh")
+    with Profile.phase("modifiers"):
+        obj = MeshObject(Mesh["Name"], mesh, ArmatureObject)
+    FillMesh(obj, Mesh, MergeDistance, Profile, Material, bCustomNormals)
+    mesh["lmd_hash"] = Key
+    if Registry is not None:
+        mesh["lmd_vertex_groups"] = [x.name for x in obj.vertex_groups]
+        Registry.add('meshes', Key, mesh)
+    return obj
+
+
+def MeshHash(Mesh, MergeDistance=None, Material=None, bCustomNormals=True):
+    """Content hash of a decoded chunk as it would be built, stored on its mesh as lmd_hash"""
+    return ContentHash("mesh", Mesh["Positions"], Mesh["Normals"] if bCustomNormals else None, Mesh["Faces"],
+                       Mesh["UVs"], Mesh["Colors"], Mesh["BoneIndices"], Mesh["Weights"], Mesh["WeightBones"],
+                       MergeDistance, Material.get("lmd_hash", Material.name) if Material else None)
 
-    if bHasColor:
-        color_layer = bm.loops.layers.color.new("Color")
-        color_layerA = bm.loops.layers.color.new("Color_ALPHA")
-        for face in bm.faces:
-            for l in face.loops:
-                l[color_layer] = ColorData[l.vert.index]
-                l[color_layerA] = AlphaData[l.vert.index]
-        bm.to_mesh(mesh)
 
-    bm.free()
+def RestoreVertexGroups(obj, mesh):
+    for Name in mesh.get("lmd_vertex_groups", []):
+        obj.vertex_groups.new(name=Name)
+
+
+def FillMesh(obj, Mesh, MergeDistance=None, Profile=None, Material=None, bCustomNormals=True):
+    """Build a decoded chunk into the empty mesh of obj, with its weights and material"""
+    Profile = Profile or ImportProfile()
+    mesh = obj.data
+    Positions, Faces = Mesh["Positions"], Mesh["Faces"]
+    BoneIndices, Weights = Mesh["BoneIndices"], Mesh["Weights"]
+    Normals = Mesh["Normals"] if bCustomNormals else None
+    # UVs and colors are stored per face corner, so they survive merging vertices
+    LoopUVs = Mesh["UVs"][Faces.ravel()]
+    LoopColors = Mesh["Colors"][Faces.ravel()] if Mesh["Colors"] is not None else None
+    # As are the normals of merged vertices, keeping hard edges
+    LoopNormals = Normals[Faces.ravel()] if Normals is not None and MergeDistance is not None else None
+    if MergeDistance is not None:
+        with Profile.phase("weld"):
+            Kept, Remap = WeldVertices(Positions, BoneIndices, Weights, MergeDistance)
+            FaceIndices = CleanFaceIndices(Remap[Faces], len(Kept))
+            Faces = Remap[Faces[FaceIndices]]
+            LoopIndices = (FaceIndices[:, None] * 3 + np.arange(3)).ravel()
+            LoopUVs = LoopUVs[LoopIndices]
+            if LoopColors is not None:
+                LoopColors = LoopColors[LoopIndices]
+            if LoopNormals is not None:
+                LoopNormals = LoopNormals[LoopIndices]
+            Positions, BoneIndices, Weights = Positions[Kept], BoneIndices[Kept], Weights[Kept]
+
+    BuildMeshData(mesh, Positions, Faces, LoopUVs, LoopColors, Profile)
+    with Profile.phase("normals"):
+        SetNormals(mesh, Normals, LoopNormals)
+    if MergeDistance is not None:
+        log.info('- %s: %s - %d -> %d', Mesh["Name"], Mesh["Material"], len(Mesh["Positions"]), len(Positions))
+    else:
+        log.info('- %s: %s - %d', Mesh["Name"], Mesh["Material"], len(Positions))
+    Profile.count("vertices", len(Positions))
+    Profile.count("faces", len(Faces))
 
     #try vertex group creation
-    for x in VGData:
-        for i in range(4):
-            if x[2][i] != 0:
-                try:
-                    if obj.vertex_groups.find(WeightBoneTable[x[1][i]]) == -1:
-                        TempVG = obj.vertex_groups.new(name=WeightBoneTable[x[1][i]])
-                    else:
-                        TempVG = obj.vertex_groups[obj.vertex_groups.find(WeightBoneTable[x[1][i]])]
-                    TempVG.add([x[0]], x[2][i], 'ADD')
-                except Exception as e:
-                    print(" WEIGHT FAIL")
-                    raise e
+    with Profile.phase("weights"):
+        AssignVertexGroups(obj, Mesh["WeightBones"], BoneIndices, Weights, Mesh["WeightBoneIDs"])
 
     #add materials
     if obj.data.materials:
-        obj.data.materials[0] = bpy.data.materials.get(MaterialNameText)
+        obj.data.materials[0] = Material
     else:
-        obj.data.materials.append(bpy.data.materials.get(MaterialNameText))
-    
-    #add armature to mesh
-    Arm = obj.modifiers.new("Armature", "ARMATURE")
-    Arm.object = ArmatureObject
+        obj.data.materials.append(Material)
+
+
+def SetNormals(mesh, Normals=None, LoopNormals=None):
+    """Shade a mesh with per-vertex or per-loop custom normals, or smooth it by angle without them.
+
+    Vertices without a normal (zero) get the one Blender computes.
+    """
+    if Normals is None or not Normals.any():
+        if hasattr(mesh, 'use_auto_smooth'):
+            mesh.use_auto_smooth = True
+            mesh.auto_smooth_angle = 1.2
+        elif hasattr(mesh, 'set_sharp_from_angle'):
+            # Blender 4.1+
+            mesh.set_sharp_from_angle(angle=1.2)
+        return
+    if hasattr(mesh, 'use_auto_smooth'):
+        # Custom normals need it before 4.1, the custom normals alone decide the shading
+        mesh.use_auto_smooth = True
+        mesh.auto_smooth_angle = math.pi
+    if LoopNormals is not None:
+        mesh.normals_split_custom_set(np.ascontiguousarray(LoopNormals, dtype=np.float32))
+    else:
+        mesh.normals_split_custom_set_from_vertices(np.ascontiguousarray(Normals, dtype=np.float32))
+
+
+def ReloadMesh(obj, Mesh, MergeDistance=None, Profile=None, Material=None, Registry=None, bCustomNormals=True):
+    """Update the object of a chunk imported before in place.
+
+    Returns False when its mesh already holds this data. Otherwise the mesh
+    is rewritten, or replaced when other objects share it, keeping the
+    object with its modifiers, parent and transform. A proxy is replaced
+    with a mesh object.
+    """
+    Profile = Profile or ImportProfile()
+    if Material is None:
+        Material = bpy.data.materials.get(Mesh["Material"])
+    if obj.type != 'MESH':
+        MeshObj = BuildMesh(Mesh, obj.parent, MergeDistance, Profile, Material, Registry, bCustomNormals)
+        ReplaceProxy(obj, MeshObj)
+        return True
+    with Profile.phase("hash"):
+        Key = MeshHash(Mesh, MergeDistance, Material, bCustomNormals)
+    if obj.data.get("lmd_hash") == Key:
+        return False
+
+    Previous = obj.data
+    # From 3.0 vertex groups belong to the mesh, clearing them would strip the weights of every user
+    bGroupsOnObject = bpy.app.version < (3, 0, 0)
+    mesh = Registry.get('meshes', Key) if Registry is not None else None
+    if mesh is not None:
+        if bGroupsOnObject:
+            obj.vertex_groups.clear()
+        obj.data = mesh
+        if not obj.vertex_groups:
+            RestoreVertexGroups(obj, mesh)
+        log.info('- %s: %s - shared with %s', Mesh["Name"], Mesh["Material"], mesh.name)
+    else:
+        if Previous.users > 1 or not hasattr(Previous, 'clear_geometry'):
+            if bGroupsOnObject:
+                obj.vertex_groups.clear()
+            obj.data = bpy.data.meshes.new("mesh")
+        else:
+            # Only this object uses the mesh, its groups can go either way
+            Previous.clear_geometry()
+            Previous.materials.clear()
+            obj.vertex_groups.clear()
+        FillMesh(obj, Mesh, MergeDistance, Profile, Material, bCustomNormals)
+        obj.data["lmd_hash"] = Key
+        if Registry is not None:
+            obj.data["lmd_vertex_groups"] = [x.name for x in obj.vertex_groups]
+            Registry.add('meshes', Key, obj.data)
+    if Previous != obj.data and Previous.users == 0:
+        bpy.data.meshes.remove(Previous)
+    return True
+
+
+def BuildProxy(Entry, Data, ArmatureObject, MergeDistance=None, Material=None, bCustomNormals=True):
+    """Placeholder object for a mesh chunk that isn't decoded yet, see LoadProxyMeshes"""
+    obj = bpy.data.objects.new(Entry["Name"], None)
+    obj.empty_display_type = 'CUBE'
+    obj.empty_display_size = 0.05
+    obj["lmd_file"] = Data["FilePath"]
+    obj["lmd_version"] = Data["Version"]
+    obj["lmd_mesh_offset"] = Entry["Offset"]
+    obj["lmd_merge_distance"] = -1.0 if MergeDistance is None else MergeDistance
+    obj["lmd_material"] = Material.name if Material else ""
+    obj["lmd_custom_normals"] = bCustomNormals
+    obj["lmd_mesh_name"] = Entry["Name"]
+    bpy.context.scene.collection.objects.link(obj)
     obj.parent = ArmatureObject
+    log.info('- %s: %s - %d (proxy)', Entry["Name"], Entry["Material"], Entry["VertCount"])
+    return obj
+
 
+def LoadProxyMeshes(Proxies, Profile=None, Registry=None):
+    """Decode and build the meshes of proxy objects, replacing them"""
+    Profile = Profile or ImportProfile()
+    Built = []
+    ByFile = {}
+    for obj in Proxies:
+        ByFile.setdefault((obj["lmd_file"], obj["lmd_version"]), []).append(obj)
+    for (filepath, Version), Objects in ByFile.items():
+        with LmdReader(filepath) as lmd:
+            BoneIDs = SkeletonBoneIDs(ReadSkeleton(lmd, lmd.pointer(0x34)))
+            for obj in Objects:
+                with Profile.phase("parse"):
+                    Mesh = ReadMeshChunk(lmd, obj["lmd_mesh_offset"], Version, BoneIDs)
+                MergeDistance = obj["lmd_merge_distance"] if obj["lmd_merge_distance"] >= 0 else None
+                Material = bpy.data.materials.get(obj.get("lmd_material", ""))
+                with Profile.phase("build"):
+                    MeshObj = BuildMesh(Mesh, obj.parent, MergeDistance, Profile, Material, Registry,
+                                        bool(obj.get("lmd_custom_normals", True)))
+                ReplaceProxy(obj, MeshObj)
+                Built.append(MeshObj)
+    return Built
 
-def BuildSkeleton(f, DataStart):
-    f.seek(DataStart + 8)
-    BoneCount = int.from_bytes(f.read(4), byteorder='little')
-    BoneOffsetTable = []
-    for x in range(BoneCount):
-        BoneOffsetTable.append(f.tell() + int.from_bytes(f.read(4), byteorder='little'))
 
-    name = os.path.split(f.name)[-1]
+def ReplaceProxy(obj, MeshObj):
+    """Put a mesh object in the place of a proxy and remove the proxy"""
+    MeshObj.matrix_parent_inverse = obj.matrix_parent_inverse
+    MeshObj["lmd_mesh_occurrence"] = obj.get("lmd_mesh_occurrence", 0)
+    Name = obj.name
+    bpy.data.objects.remove(obj)
+    MeshObj.name = Name
+
+
+def ReadSkeleton(lmd, DataStart):
+    Bones = []
+    for x in lmd.pointer_table(DataStart + 8):
+        Bones.append({
+            "Name": lmd.string(lmd.pointer(x + 4)),
+            "Parent": lmd.string(lmd.pointer(x + 0x48)),
+            "Magic": lmd.u32(x),
+            "Matrix": lmd.array(x + 8, '<f4', 16).reshape(4, 4).copy(),
+            "Position": tuple(lmd.array(x + 0x38, '<f4', 3).tolist()),
+        })
+    return Bones
+
+
+def SkeletonBoneIDs(Bones):
+    """Index of every bone name in a skeleton, the first one when names repeat"""
+    BoneIDs = {}
+    for i, Bone in enumerate(Bones):
+        BoneIDs.setdefault(Bone["Name"], i)
+    return BoneIDs
+
+
+def BoneRestMatrices(Bones):
+    """Armature space rest matrices of a skeleton.
+
+    Matches posing each bone with the rotation of its inverted matrix and its
+    position then applying the pose as rest pose, parents first: every rest
+    matrix is its parent's composed with that local transform. Parents are
+    looked up by name, so file order doesn't matter.
+    Returns the parent index of each bone (-1 for roots) and an (N, 4, 4) array.
+    """
+    Count = len(Bones)
+    BoneIndex = SkeletonBoneIDs(Bones)
+    Parents = np.full(Count, -1, dtype=np.int64)
+    for i, Bone in enumerate(Bones):
+        if Bone["Magic"] >= 0x5000:
+            Parents[i] = BoneIndex.get(Bone["Parent"], -1)
+
+    Depth = np.where(Parents < 0, 0, -1)
+    while True:
+        Ready = (Depth < 0) & (Depth[Parents] >= 0)
+        if not Ready.any():
+            break
+        Depth[Ready] = Depth[Parents[Ready]] + 1
+    # Whatever is left is part of a parenting loop
+    Parents[Depth < 0] = -1
+    Depth[Depth < 0] = 0
+
+    Matrices = np.array([Bone["Matrix"] for Bone in Bones], dtype=np.float64).reshape(Count, 4, 4)
+    try:
+        Rotations = np.linalg.inv(Matrices)[:, :3, :3]
+    except np.linalg.LinAlgError:
+        Rotations = np.linalg.pinv(Matrices)[:, :3, :3]
+    Lengths = np.linalg.norm(Rotations, axis=1, keepdims=True)
+    Rotations = Rotations / np.where(Lengths > 0, Lengths, 1)
+
+    Local = np.tile(np.eye(4), (Count, 1, 1))
+    Local[:, :3, :3] = Rotations
+    Local[:, :3, 3] = [Bone["Position"] for Bone in Bones] if Count else np.zeros((0, 3))
+    Rest = Local.copy()
+    for Level in range(1, int(Depth.max(initial=0)) + 1):
+        Bone = np.flatnonzero(Depth == Level)
+        Rest[Bone] = Rest[Parents[Bone]] @ Local[Bone]
+    return Parents, Rest
+
+
+def BuildSkeleton(name, Bones, Registry=None):
+    """Armature object of a skeleton, sharing the armature of an identical one already imported"""
+    Key = SkeletonHash(Bones)
+    if Registry is not None:
+        armature_data = Registry.get('armatures', Key)
+        if armature_data is not None:
+            armature_obj = bpy.data.objects.new(name, armature_data)
+            bpy.context.scene.collection.objects.link(armature_obj)
+            log.info("Sharing the skeleton of %s", armature_data.name)
+            return armature_obj
+
     armature_data = bpy.data.armatures.new(name)
     armature_obj = bpy.data.objects.new(name, armature_data)
     bpy.context.scene.collection.objects.link(armature_obj)
+    BuildBones(armature_obj, Bones)
+    armature_data["lmd_hash"] = Key
+    if Registry is not None:
+        Registry.add('armatures', Key, armature_data)
+    return armature_obj
+
+
+def SkeletonHash(Bones):
+    return ContentHash("armature", [(x["Name"], x["Parent"], x["Magic"], x["Matrix"], x["Position"]) for x in Bones])
+
+
+def ReloadSkeleton(armature_obj, Bones, Registry=None):
+    """Update the bones of an armature imported before, returns False when they didn't change"""
+    Key = SkeletonHash(Bones)
+    if armature_obj.data.get("lmd_hash") == Key:
+        return False
+    armature_data = Registry.get('armatures', Key) if Registry is not None else None
+    if armature_data is not None:
+        armature_obj.data = armature_data
+        return True
+    if armature_obj.data.users > 1:
+        armature_obj.data = armature_obj.data.copy()
+    BuildBones(armature_obj, Bones)
+    armature_obj.data["lmd_hash"] = Key
+    if Registry is not None:
+        Registry.add('armatures', Key, armature_obj.data)
+    return True
+
+
+def BuildBones(armature_obj, Bones):
+    """Replace the bones of an armature object with those of a skeleton"""
+    Parents, RestMatrices = BoneRestMatrices(Bones)
+    armature_data = armature_obj.data
     select_all(False)
     armature_obj.select_set(True)
     bpy.context.view_layer.objects.active = armature_obj
     utils_set_mode('EDIT')
-    
-    BoneTable = {}
-    for x in BoneOffsetTable:
-        f.seek(x)
-        Magic = int.from_bytes(f.read(4), byteorder='little')
-        f.seek(x + 4)
-        NameOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        f.seek(NameOffset)
-        BoneNameLength = int.from_bytes(f.read(4), byteorder='little')
-        BoneName = f.read(BoneNameLength).decode('utf-8', 'replace')
-        f.seek(x + 8)
-        BoneMatrix = mathutils.Matrix((
-            struct.unpack('ffff', f.read(4 * 4)),
-            struct.unpack('ffff', f.read(4 * 4)),
-            struct.unpack('ffff', f.read(4 * 4)),
-            struct.unpack('ffff', f.read(4 * 4))
-        ))
-        f.seek(x + 0x38)
-        BonePos = struct.unpack('fff', f.read(4 * 3))
-        f.seek(x + 0x48)
-        BoneParentOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        f.seek(BoneParentOffset)
-        BoneParentNameLength = int.from_bytes(f.read(4), byteorder='little')
-        BoneParentName = f.read(BoneParentNameLength).decode('utf-8', 'replace')
-        
-        edit_bone = armature_obj.data.edit_bones.new(BoneName)
+    for edit_bone in list(armature_data.edit_bones):
+        armature_data.edit_bones.remove(edit_bone)
+
+    EditBones = []
+    for Bone, RestMatrix in zip(Bones, RestMatrices):
+        edit_bone = armature_data.edit_bones.new(Bone["Name"])
         edit_bone.use_connect = False
         edit_bone.use_inherit_rotation = True
         edit_bone.use_inherit_scale = True
         edit_bone.use_local_location = True
         edit_bone.head = (0, 0, 0)
         edit_bone.tail = (0, 0.05, 0)
-        armature_obj.data.edit_bones.active = edit_bone
-        BoneTable[BoneName] = {}
-        BoneTable[BoneName]["Bone"] = edit_bone
-        BoneTable[BoneName]["Parent"] = BoneParentName
-        BoneTable[BoneName]["Position"] = BonePos
-        BoneTable[BoneName]["Matrix"] = BoneMatrix
-        BoneTable[BoneName]["Name"] = BoneName
-        if Magic < 0x5000: continue
-        edit_bone.parent = BoneTable[BoneParentName]["Bone"]
-        #print(BoneName)
-    
-    bpy.context.view_layer.objects.active = armature_obj
-    utils_set_mode("POSE")
-    for x in BoneTable:
-        pbone = armature_obj.pose.bones[x]
-        pbone.rotation_mode = 'XYZ'
-        pbone.rotation_euler = BoneTable[x]["Matrix"].inverted().to_euler()
-        pbone.location = BoneTable[x]["Position"]
-        bpy.ops.pose.armature_apply()
+        edit_bone.matrix = mathutils.Matrix(RestMatrix.tolist())
+        EditBones.append(edit_bone)
+    for edit_bone, Parent in zip(EditBones, Parents):
+        if Parent >= 0:
+            edit_bone.parent = EditBones[Parent]
     
     utils_set_mode('OBJECT')
-    return armature_obj
+    for pbone in armature_obj.pose.bones:
+        pbone.rotation_mode = 'XYZ'
 
 
-def ParseMaterials(f, DataStart):
-    MatTable = []
-    f.seek(DataStart + 4)
-    MaterialNameOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-    f.seek(DataStart + 12)
-    TextureCount = int.from_bytes(f.read(4), byteorder='little')
-    TextureOffSetTable = []
-    for x in range(TextureCount):
-        TextureOffSetTable.append(f.tell() + int.from_bytes(f.read(4), byteorder='little'))
-    Textures = {}
-    print("Loading {} texture{}:".format(TextureCount, '' if TextureCount == 1 else 's'))
-    for x in TextureOffSetTable:
-        f.seek(x + 4)
-        TexFileRefOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        TexFileNameOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        TexFileMapOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        f.seek(TexFileNameOffset)
-        TexFileNameSize = int.from_bytes(f.read(4), byteorder='little')
-        TexFileName = f.read(TexFileNameSize).decode('utf-8', 'replace')
-
-        f.seek(TexFileRefOffset)
-        TexFileRefSize = int.from_bytes(f.read(4), byteorder='little')
-        TexFileRef = f.read(TexFileRefSize).decode('utf-8', 'replace')
-
-        f.seek(TexFileMapOffset)
-        TexFileMapSize = int.from_bytes(f.read(4), byteorder='little')
-        TexFileMap = f.read(TexFileMapSize).decode('utf-8', 'replace')
-        Textures.update({TexFileRef:TexFileName})
-        tex = bpy.data.textures.get(TexFileName)
-        if not tex:
-            tex = bpy.data.textures.new(name=TexFileName,type='IMAGE')
-            try:
-                filepath = os.path.split(os.path.realpath(f.name))
-                files = find_file(TexFileName, filepath[0])
-                # Try finding the file by brute force
-                if not files:
-                    files = find_file(TexFileName.replace(".tga", ".ktx.tga"), filepath[0])
-                if not files:
-                    files = find_file(TexFileName.replace(".tga", ".png"), filepath[0])
-                if not files:
-                    files = find_file(TexFileName.replace(".tga", ".ktx.png"), filepath[0])
-                if not files:
-                    files = find_file(TexFileName.replace(".tga", "*.png"), filepath[0])
-                if files:
-                    bpy.ops.image.open(filepath=files[0])
-                    filename = os.path.split(files[0])[-1]
-                    tex.image = bpy.data.images.get(filename)
-            except:
-                print(traceback.format_exc())
-        print("- {}: {} / {}".format(TexFileRef, TexFileName, TexFileMap))
-
-    f.seek(MaterialNameOffset)
-    MaterialCount = int.from_bytes(f.read(4), byteorder='little')
-    print("Loading {} material{}:".format(MaterialCount, '' if MaterialCount == 1 else 's'))
-    MatOffsetTable = []
-    for x in range(MaterialCount):
-        MatOffsetTable.append(f.tell() + int.from_bytes(f.read(4), byteorder='little'))
-    for x in MatOffsetTable:
-        f.seek(x + 4)
-        MaterialNameTextOffset = f.tell() + int.from_bytes(f.read(4), byteorder='little')
-        f.seek(MaterialNameTextOffset)
-        MaterialNameTextSize = int.from_bytes(f.read(4), byteorder='little')
-        MaterialNameText = f.read(MaterialNameTextSize).decode('utf-8', 'replace')
-
-        f.seek(x + 0x38)
-        flag = int.from_bytes(f.read(4), byteorder='little')
+def ParseMaterials(lmd, DataStart):
+    Textures = []
+    for x in lmd.pointer_table(DataStart + 12):
+        Textures.append({
+            "Ref": lmd.string(lmd.pointer(x + 4)),
+            "FileName": lmd.string(lmd.pointer(x + 8)),
+            "Map": lmd.string(lmd.pointer(x + 12)),
+        })
+
+    Materials = []
+    for x in lmd.pointer_table(lmd.pointer(DataStart + 4)):
+        flag = lmd.u32(x + 0x38)
         if flag == 0x40000000:
-            f.seek(x + 0x44)
+            TexSlotsOffset = lmd.pointer_table(x + 0x44)
         else:
-            f.seek(x + 0x40)
-        TexSlotCount = int.from_bytes(f.read(4), byteorder='little')
-        TexSlotsOffset = []
-        TexSlots = []
-        print("- {}".format(MaterialNameText))
-
-        for y in range(TexSlotCount):
-            TexSlotsOffset.append(f.tell() + int.from_bytes(f.read(4), byteorder='little'))
-        for texnode in TexSlotsOffset:
-            f.seek(texnode)
-            MaterialFileReferenceSize = int.from_bytes(f.read(4), byteorder='little')
-            MaterialFileReferenceName = f.read(MaterialFileReferenceSize).decode('utf-8', 'replace')
-            print('- Texture slot [{}]'.format(MaterialFileReferenceName))
-            TexSlots.append(Textures.get(MaterialFileReferenceName))
-
-        mat = bpy.data.materials.get(MaterialNameText)
-        if mat == None:
-            setupMaterialNodes(mat, MaterialNameText, TexSlots)
-
-        MatTable.append(mat)
+            TexSlotsOffset = lmd.pointer_table(x + 0x40)
+        Materials.append({
+            "Name": lmd.string(lmd.pointer(x + 4)),
+            "TexSlots": [lmd.string(texnode) for texnode in TexSlotsOffset],
+        })
+
+    return {"Textures": Textures, "Materials": Materials}
+
+
+# ETC1/ETC2 modifier tables, by codeword then pixel index
+ETC_MODIFIERS = np.array([[2, 8, -2, -8], [5, 17, -5, -17], [9, 29, -9, -29], [13, 42, -13, -42],
+                          [18, 60, -18, -60], [24, 80, -24, -80], [33, 106, -33, -106], [47, 183, -47, -183]])
+# ETC2 T and H mode distances
+ETC_DISTANCES = np.array([3, 6, 11, 16, 23, 32, 41, 64])
+EAC_MODIFIERS = np.array([
+    [-3, -6, -9, -15, 2, 5, 8, 14], [-3, -7, -10, -13, 2, 6, 9, 12], [-2, -5, -8, -13, 1, 4, 7, 12],
+    [-2, -4, -6, -13, 1, 3, 5, 12], [-3, -6, -8, -12, 2, 5, 7, 11], [-3, -7, -9, -11, 2, 6, 8, 10],
+    [-4, -7, -8, -11, 3, 6, 7, 10], [-3, -5, -8, -11, 2, 4, 7, 10], [-2, -6, -8, -10, 1, 5, 7, 9],
+    [-2, -5, -8, -10, 1, 4, 7, 9], [-2, -4, -8, -10, 1, 3, 7, 9], [-2, -5, -7, -10, 1, 4, 6, 9],
+    [-3, -4, -7, -10, 2, 3, 6, 9], [-1, -2, -3, -10, 0, 1, 2, 9], [-4, -6, -8, -9, 3, 5, 7, 8],
+    [-3, -5, -7, -9, 2, 4, 6, 8]])
+
+
+def _BlockWords(Blocks):
+    """64 bit big endian words of (N, 8) byte blocks, as int64"""
+    return Blocks.copy().view('>u8').astype(np.int64).ravel()
+
+
+def _Bits(Words, High, Low):
+    return (Words >> Low) & ((1 << (High - Low + 1)) - 1)
+
+
+def DecodeEtc2Rgb(Blocks, bEtc2=True):
+    """Decode (N, 8) ETC1 or ETC2 RGB blocks to (N, 16, 3) uint8 colors.
+
+    Pixels are in block order, column by column (index x * 4 + y). ETC2 adds
+    modes to ETC1 in the bit patterns ETC1 leaves invalid; every block is
+    decoded in all modes at once and each keeps the result of its own mode.
+    """
+    W = _BlockWords(Blocks)
+    Count = len(W)
+    Pixel = np.arange(16)
+    X, Y = Pixel // 4, Pixel % 4
+    # Two bit pixel indices, most significant bits in the upper half word
+    Indices = ((W[:, None] >> (Pixel + 16)) & 1) << 1 | ((W[:, None] >> Pixel) & 1)
+    bDiff = _Bits(W, 33, 33).astype(bool)
+    bFlip = _Bits(W, 32, 32).astype(bool)
+
+    # Individual and differential modes, two sub-blocks with a base color and a modifier table each
+    Base = np.stack([_Bits(W, 63, 59), _Bits(W, 55, 51), _Bits(W, 47, 43)], axis=1)
+    Delta = np.stack([_Bits(W, 58, 56), _Bits(W, 50, 48), _Bits(W, 42, 40)], axis=1)
+    Base2 = Base + Delta - ((Delta >= 4) << 3)
+    Individual1 = np.stack([_Bits(W, 63, 60), _Bits(W, 55, 52), _Bits(W, 47, 44)], axis=1) * 17
+    Individual2 = np.stack([_Bits(W, 59, 56), _Bits(W, 51, 48), _Bits(W, 43, 40)], axis=1) * 17
+    Color1 = np.where(bDiff[:, None], (Base << 3) | (Base >> 2), Individual1)
+    # Overflowing blocks are other ETC2 modes, ETC1 decoders wrap them around
+    Wrapped = Base2 & 31
+    Color2 = np.where(bDiff[:, None], (Wrapped << 3) | (Wrapped >> 2), Individual2)
+    SubBlock = np.where(bFlip[:, None], Y >= 2, X >= 2)
+    Tables = np.where(SubBlock, _Bits(W, 36, 34)[:, None], _Bits(W, 39, 37)[:, None])
+    Colors = np.where(SubBlock[..., None], Color2[:, None], Color1[:, None])
+    Colors = Colors + ETC_MODIFIERS[Tables, Indices][..., None]
+
+    # ETC2 modes, picked by the differential base color overflowing in red, green or blue
+    bOverflow = ((Base2 < 0) | (Base2 > 31)) & bEtc2
+    bT = bDiff & bOverflow[:, 0]
+    bH = bDiff & ~bT & bOverflow[:, 1]
+    bPlanar = bDiff & ~bT & ~bH & bOverflow[:, 2]
+
+    def Extend4(*Channels):
+        return np.stack(Channels, axis=1) * 17
+
+    if bT.any() or bH.any():
+        # T mode, one color and three around a second
+        TColor1 = Extend4(_Bits(W, 60, 59) << 2 | _Bits(W, 57, 56), _Bits(W, 55, 52), _Bits(W, 51, 48))
+        TColor2 = Extend4(_Bits(W, 47, 44), _Bits(W, 43, 40), _Bits(W, 39, 36))
+        Distance = ETC_DISTANCES[_Bits(W, 35, 34) << 1 | _Bits(W, 32, 32)][:, None]
+        TPalette = np.stack([TColor1, TColor2 + Distance, TColor2, TColor2 - Distance], axis=1)
+        # H mode, two colors each shifted both ways
+        HRaw1 = [_Bits(W, 62, 59), _Bits(W, 58, 56) << 1 | _Bits(W, 52, 52), _Bits(W, 51, 51) << 3 | _Bits(W, 49, 47)]
+        HRaw2 = [_Bits(W, 46, 43), _Bits(W, 42, 39), _Bits(W, 38, 35)]
+        bOrder = (HRaw1[0] << 8 | HRaw1[1] << 4 | HRaw1[2]) >= (HRaw2[0] << 8 | HRaw2[1] << 4 | HRaw2[2])
+        Distance = ETC_DISTANCES[_Bits(W, 34, 34) << 2 | _Bits(W, 32, 32) << 1 | bOrder][:, None]
+        HColor1, HColor2 = Extend4(*HRaw1), Extend4(*HRaw2)
+        HPalette = np.stack([HColor1 + Distance, HColor1 - Distance, HColor2 + Distance, HColor2 - Distance], axis=1)
+        Palette = np.where(bT[:, None, None], TPalette, HPalette)
+        Chosen = Palette[np.arange(Count)[:, None], Indices]
+        Colors = np.where((bT | bH)[:, None, None], Chosen, Colors)
+
+    if bPlanar.any():
+        # Planar mode, a gradient from an origin color towards the right and bottom colors
+        def Extend(Value, Bits):
+            return Value << (8 - Bits) | Value >> (2 * Bits - 8)
+        Origin = np.stack([Extend(_Bits(W, 62, 57), 6),
+                           Extend(_Bits(W, 56, 56) << 6 | _Bits(W, 54, 49), 7),
+                           Extend(_Bits(W, 48, 48) << 5 | _Bits(W, 44, 43) << 3 | _Bits(W, 41, 39), 6)], axis=1)
+        Horizontal = np.stack([Extend(_Bits(W, 38, 34) << 1 | _Bits(W, 32, 32), 6),
+                               Extend(_Bits(W, 31, 25), 7), Extend(_Bits(W, 24, 19), 6)], axis=1)
+        Vertical = np.stack([Extend(_Bits(W, 18, 13), 6), Extend(_Bits(W, 12, 6), 7), Extend(_Bits(W, 5, 0), 6)],
+                            axis=1)
+        Gradient = (X[None, :, None] * (Horizontal - Origin)[:, None] + Y[None, :, None] * (Vertical - Origin)[:, None]
+                    + 4 * Origin[:, None] + 2) >> 2
+        Colors = np.where(bPlanar[:, None, None], Gradient, Colors)
+
+    return np.clip(Colors, 0, 255).astype(np.uint8)
+
+
+def DecodeEacAlpha(Blocks):
+    """Decode (N, 8) EAC alpha blocks to (N, 16) uint8 values, in the same pixel order as DecodeEtc2Rgb"""
+    W = _BlockWords(Blocks)
+    Indices = (W[:, None] >> (45 - 3 * np.arange(16))) & 7
+    Modifiers = EAC_MODIFIERS[_Bits(W, 51, 48)[:, None], Indices]
+    return np.clip(_Bits(W, 63, 56)[:, None] + Modifiers * _Bits(W, 55, 52)[:, None], 0, 255).astype(np.uint8)
+
+
+KTX_IDENTIFIER = b'\xabKTX 11\xbb\r\n\x1a\n'
+# glInternalFormat -> (bytes per block, has EAC alpha)
+KTX_ETC_FORMATS = {
+    0x8D64: (8, False),   # ETC1_RGB8_OES
+    0x9274: (8, False),   # COMPRESSED_RGB8_ETC2
+    0x9275: (8, False),   # COMPRESSED_SRGB8_ETC2
+    0x9278: (16, True),   # COMPRESSED_RGBA8_ETC2_EAC
+    0x9279: (16, True),   # COMPRESSED_SRGB8_ALPHA8_ETC2_EAC
+}
+# glFormat -> channels of uncompressed unsigned byte textures
+KTX_RAW_FORMATS = {0x1907: 3, 0x1908: 4}
+
+
+def ReadKtxHeader(Data):
+    """Header fields of a KTX 1 file, raises ValueError for anything else"""
+    if not Data.startswith(KTX_IDENTIFIER) or len(Data) < 64:
+        raise ValueError("not a KTX file")
+    Endian = '<' if struct.unpack_from('<I', Data, 12)[0] == 0x04030201 else '>'
+    Fields = struct.unpack_from(Endian + '13I', Data, 12)
+    Header = dict(zip(('Endianness', 'glType', 'glTypeSize', 'glFormat', 'glInternalFormat', 'glBaseInternalFormat',
+                       'Width', 'Height', 'Depth', 'ArrayElements', 'Faces', 'MipmapLevels', 'KeyValueBytes'), Fields))
+    Header['Endian'] = Endian
+    Header['DataStart'] = 64 + Header['KeyValueBytes']
+    if Header['glInternalFormat'] not in KTX_ETC_FORMATS and not (
+            Header['glType'] == 0x1401 and Header['glFormat'] in KTX_RAW_FORMATS):
+        raise ValueError("unsupported KTX format 0x{:04X}".format(Header['glInternalFormat']))
+    if not Header['Width'] or not Header['Height']:
+        raise ValueError("empty KTX texture")
+    # Rows are stored top first unless the orientation says otherwise
+    Header['BottomFirst'] = b'KTXorientation\0S=r,T=u' in Data[64:Header['DataStart']]
+    return Header
+
+
+def DecodeKtx(Data):
+    """Top level of a KTX 1 texture as an (height, width, 4) RGBA uint8 array, top row first"""
+    Header = ReadKtxHeader(Data)
+    Width, Height = Header['Width'], Header['Height']
+    Size = struct.unpack_from(Header['Endian'] + 'I', Data, Header['DataStart'])[0]
+    Start = Header['DataStart'] + 4
+    if Start + Size > len(Data):
+        raise ValueError("truncated KTX file")
+    Format = KTX_ETC_FORMATS.get(Header['glInternalFormat'])
+    if Format is None:
+        Channels = KTX_RAW_FORMATS[Header['glFormat']]
+        # Rows are padded to 4 bytes
+        Stride = (Width * Channels + 3) & ~3
+        Rows = np.frombuffer(Data, np.uint8, Stride * Height, Start).reshape(Height, Stride)
+        Pixels = np.full((Height, Width, 4), 255, dtype=np.uint8)
+        Pixels[..., :Channels] = Rows[:, :Width * Channels].reshape(Height, Width, Channels)
+    else:
+        BlockSize, bAlpha = Format
+        BlocksX, BlocksY = (Width + 3) // 4, (Height + 3) // 4
+        if Size < BlocksX * BlocksY * BlockSize:
+            raise ValueError("truncated KTX image")
+        Blocks = np.frombuffer(Data, np.uint8, BlocksX * BlocksY * BlockSize, Start).reshape(-1, BlockSize)
+        Texels = np.full((len(Blocks), 16, 4), 255, dtype=np.uint8)
+        # In slices, the decoders' temporaries are several times the size of the image
+        for Slice in range(0, len(Blocks), 1 << 14):
+            Part = Blocks[Slice:Slice + (1 << 14)]
+            Texels[Slice:Slice + len(Part), :, :3] = DecodeEtc2Rgb(Part[:, -8:], Header['glInternalFormat'] != 0x8D64)
+            if bAlpha:
+                Texels[Slice:Slice + len(Part), :, 3] = DecodeEacAlpha(Part[:, :8])
+        # (block y, block x, pixel x, pixel y) -> rows of pixels
+        Pixels = Texels.reshape(BlocksY, BlocksX, 4, 4, 4).transpose(0, 3, 1, 2, 4)
+        Pixels = Pixels.reshape(BlocksY * 4, BlocksX * 4, 4)[:Height, :Width]
+    if Header['BottomFirst']:
+        Pixels = Pixels[::-1]
+    return np.ascontiguousarray(Pixels)
+
+
+def DecodeKtxFile(filepath, Cache=None):
+    """Pixels of a KTX file, decoded at most once with a TextureCache"""
+    with open(filepath, 'rb') as f:
+        Data = f.read()
+    if Cache is None:
+        return DecodeKtx(Data)
+    Key = Cache.key(Data)
+    Pixels = Cache.load(Key)
+    if Pixels is None:
+        Pixels = DecodeKtx(Data)
+        try:
+            Cache.store(Key, Pixels)
+        except OSError:
+            log.warning("Couldn't cache the decoded %s", filepath, exc_info=True)
+    return Pixels
+
+
+def LoadKtxImage(filepath, Cache=None):
+    """Image datablock holding the pixels of a KTX file, packed into the .blend file"""
+    Pixels = DecodeKtxFile(filepath, Cache)
+    Height, Width = Pixels.shape[:2]
+    image = bpy.data.images.new(os.path.basename(filepath), Width, Height, alpha=True)
+    # Blender images start at the bottom row
+    image.pixels.foreach_set((Pixels[::-1].astype(np.float32) / 255).ravel())
+    image["lmd_source"] = filepath
+    image.pack()
+    return image
+
+
+def CheckTextureFile(filepath):
+    """Read a whole texture file and check its header.
+
+    Returns None when it looks fine, else what is wrong with it.
+    """
+    with open(filepath, 'rb') as f:
+        Data = f.read()
+    Extension = os.path.splitext(filepath)[1].lower()
+    if Extension == '.png':
+        if not Data.startswith(b'\x89PNG\r\n\x1a\n'):
+            return "not a PNG file"
+    elif Extension == '.tga':
+        if len(Data) < 18:
+            return "truncated TGA header"
+        ImageType = Data[2]
+        Width, Height = struct.unpack_from('<HH', Data, 12)
+        if ImageType not in (1, 2, 3, 9, 10, 11) or not Width or not Height:
+            return "not a TGA file"
+    elif Extension == '.ktx':
+        try:
+            ReadKtxHeader(Data)
+        except ValueError as e:
+            return str(e)
+    return None
+
+
+class TexturePrefetcher:
+    """Reads and checks the texture files of LMD files on a thread pool.
+
+    Started before the build, so texture I/O overlaps with parsing and mesh
+    building, and the images are in the OS file cache once Blender loads them.
+    With a TextureCache, KTX files are decoded into it as well.
+    """
+
+    def __init__(self, Threads=8, Cache=None):
+        self.pool = concurrent.futures.ThreadPoolExecutor(Threads)
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.cache = Cache
+
+    @staticmethod
+    def _key(filepath):
+        return os.path.normcase(os.path.realpath(filepath))
+
+    def submit(self, filepath):
+        Key = self._key(filepath)
+        with self.lock:
+            if Key not in self.futures:
+                self.futures[Key] = self.pool.submit(self._prefetch, filepath)
+
+    def _prefetch(self, filepath):
+        Error = CheckTextureFile(filepath)
+        if Error is None and self.cache is not None and filepath.lower().endswith('.ktx'):
+            try:
+                DecodeKtxFile(filepath, self.cache)
+            except ValueError as e:
+                return str(e)
+        return Error
+
+    def submit_lmd(self, filepath, TexIndex):
+        """Resolve and prefetch the textures of an LMD file in the background"""
+        def Resolve():
+            try:
+                with LmdReader(filepath) as lmd:
+                    MaterialData = ParseMaterials(lmd, lmd.pointer(0x38))
+                for Texture in MaterialData["Textures"]:
+                    TexFilePath = ResolveTexture(TexIndex, Texture["FileName"])
+                    if TexFilePath:
+                        self.submit(TexFilePath)
+                        AoFilePath = TexFilePath.replace('_co.', '_ao.')
+                        if AoFilePath != TexFilePath and os.path.exists(AoFilePath):
+                            self.submit(AoFilePath)
+            except Exception:
+                # Only a prefetch, the import resolves the textures again
+                log.warning("Couldn't prefetch the textures of %s", filepath, exc_info=True)
+        self.pool.submit(Resolve)
+
+    def result(self, filepath):
+        """Wait for a prefetched file, returns CheckTextureFile's result"""
+        with self.lock:
+            Future = self.futures.get(self._key(filepath))
+        if Future is None:
+            return None
+        try:
+            return Future.result()
+        except OSError as e:
+            return str(e)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def ImagePath(image):
+    """File an image was loaded from, KTX images are packed and keep it aside"""
+    return image.get("lmd_source") or bpy.path.abspath(image.filepath)
+
+
+def LoadImage(filepath, TextureCache=None):
+    """Image datablock of a file, reusing the one already loaded for the same path"""
+    Key = os.path.normcase(os.path.realpath(filepath))
+    image = bpy.data.images.get(_Images.get(Key, ""))
+    if image is not None and os.path.normcase(os.path.realpath(ImagePath(image))) == Key:
+        return image
+    if filepath.lower().endswith('.ktx'):
+        image = LoadKtxImage(filepath, TextureCache)
+    else:
+        image = bpy.data.images.load(filepath, check_existing=True)
+    # Names, not datablocks, are kept since undo invalidates those
+    _Images[Key] = image.name
+    return image
+
+
+# Image datablock names by normalized absolute file path
+_Images = {}
+
+
+def BuildMaterials(filepath, MaterialData, SaveTextureIndex=False, Prefetch=None, Profile=None, Registry=None,
+                   TextureCache=None):
+    """Create the textures and materials of a file, returns its materials by name.
+
+    With a registry, materials with the same name and texture files as one
+    imported before are shared, otherwise every material is created again.
+    """
+    Profile = Profile or ImportProfile()
+    MatTable = {}
+    TexIndex = GetTextureIndex(os.path.dirname(os.path.realpath(filepath)), SaveTextureIndex)
+    TextureCount = len(MaterialData["Textures"])
+    Textures = {}
+    log.info("Loading %d texture%s:", TextureCount, '' if TextureCount == 1 else 's')
+    with Profile.phase("textures"):
+        for Texture in MaterialData["Textures"]:
+            TexFileRef = Texture["Ref"]
+            TexFileName = Texture["FileName"]
+            TexFileMap = Texture["Map"]
+            Textures.update({TexFileRef:TexFileName})
+            tex = bpy.data.textures.get(TexFileName)
+            if not tex:
+                tex = bpy.data.textures.new(name=TexFileName,type='IMAGE')
+                try:
+                    with Profile.phase("resolve"):
+                        TexFilePath = ResolveTexture(TexIndex, TexFileName)
+                        Error = Prefetch.result(TexFilePath) if Prefetch and TexFilePath else None
+                    if Error:
+                        log.warning("- Skipping %s: %s", TexFilePath, Error)
+                    elif TexFilePath:
+                        with Profile.phase("load"):
+                            tex.image = LoadImage(TexFilePath, TextureCache)
+                except:
+                    log.exception("Couldn't load texture %s", TexFileName)
+            log.debug("- %s: %s / %s", TexFileRef, TexFileName, TexFileMap)
+
+    MaterialCount = len(MaterialData["Materials"])
+    log.info("Loading %d material%s:", MaterialCount, '' if MaterialCount == 1 else 's')
+    with Profile.phase("materials"):
+        for Material in MaterialData["Materials"]:
+            MaterialNameText = Material["Name"]
+            TexSlots = []
+            log.debug("- %s", MaterialNameText)
+
+            for MaterialFileReferenceName in Material["TexSlots"]:
+                log.debug('- Texture slot [%s]', MaterialFileReferenceName)
+                TexSlots.append(Textures.get(MaterialFileReferenceName))
+
+            mat = None
+            if Registry is not None:
+                Images = [bpy.data.textures[x].image if x in bpy.data.textures else None for x in TexSlots]
+                Key = ContentHash("material", MaterialNameText, TexSlots,
+                                  [ImagePath(x) if x else None for x in Images])
+                mat = Registry.get('materials', Key)
+            if mat is None:
+                mat = setupMaterialNodes(mat, MaterialNameText, TexSlots, TextureCache)
+                if Registry is not None:
+                    Registry.add('materials', Key, mat)
+            else:
+                Profile.count("shared_materials")
+
+            MatTable[MaterialNameText] = mat
 
     return MatTable
 
 
-def setupMaterialNodes(mat, MaterialNameText, TexSlots):
+def ReadLmd(filepath, Version, Cache=None, CacheKey=None, Profile=None, Selection=None):
+    """Parse a whole LMD file into plain data, without touching Blender.
+
+    Only the meshes Selection decodes are read past their header, the index
+    of every mesh chunk is kept in "MeshIndex". With a cache the result is
+    also stored under CacheKey, if every mesh was decoded.
+    """
+    Profile = Profile or ImportProfile()
+    Selection = Selection or MeshSelection()
+    with LmdReader(filepath) as lmd:
+        with Profile.phase("header"):
+            Profile.count("bytes_read", len(lmd))
+            BoneData, MaterialData = lmd.pointer(0x34), lmd.pointer(0x38)
+            MeshOffsets = lmd.pointer_table(0x48)
+        with Profile.phase("skeleton"):
+            Skeleton = ReadSkeleton(lmd, BoneData)
+        with Profile.phase("materials"):
+            Materials = ParseMaterials(lmd, MaterialData)
+        with Profile.phase("mesh_index"):
+            MeshIndex = [ReadMeshHeader(lmd, x) for x in MeshOffsets]
+        with Profile.phase("meshes"):
+            BoneIDs = SkeletonBoneIDs(Skeleton)
+            Meshes = [ReadMeshChunk(lmd, x["Offset"], Version, BoneIDs) for x in MeshIndex
+                      if Selection.decode(x["Name"])]
+        Data = {
+            "FilePath": filepath,
+            "Name": os.path.split(filepath)[-1],
+            "Version": Version,
+            "Skeleton": Skeleton,
+            "Materials": Materials,
+            "MeshIndex": MeshIndex,
+            "Meshes": Meshes,
+        }
+    if Cache is not None and CacheKey is not None and len(Meshes) == len(MeshIndex):
+        try:
+            with Profile.phase("cache_store"):
+                Cache.store(CacheKey, Data)
+        except OSError:
+            log.warning("Couldn't cache %s", filepath, exc_info=True)
+    return Data
+
+
+def _ReadLmdProfiled(filepath, Version, Cache=None, CacheKey=None, Selection=None):
+    """ReadLmd for worker processes, also returning the profile of the parse"""
+    Profile = ImportProfile()
+    Data = ReadLmd(filepath, Version, Cache, CacheKey, Profile, Selection)
+    return Data, Profile
+
+
+class DiskCache:
+    """Directory of cache entries bounded to MaxSize bytes.
+
+    Subclasses give the files of an entry, the first one is named after the
+    key plus Suffix and its mtime is the entry's last use. The least recently
+    used entries are evicted first.
+    """
+    Suffix = ''
+
+    def __init__(self, directory, MaxSize=2 * 1024 ** 3):
+        self.directory = directory
+        self.MaxSize = MaxSize
+
+    def _files(self, Key):
+        raise NotImplementedError
+
+    def entries(self):
+        """(files, size, last use) of every entry, oldest first"""
+        Result = []
+        try:
+            Names = os.listdir(self.directory)
+        except OSError:
+            return Result
+        for Name in Names:
+            if not Name.endswith(self.Suffix):
+                continue
+            Files = self._files(Name[:-len(self.Suffix)])
+            try:
+                Stat = os.stat(Files[0])
+                Size = Stat.st_size + sum(os.path.getsize(x) for x in Files[1:] if os.path.exists(x))
+            except OSError:
+                continue
+            Result.append((Files, Size, Stat.st_mtime))
+        Result.sort(key=lambda x: x[2])
+        return Result
+
+    def _remove(self, Files):
+        for Path in Files:
+            try:
+                os.remove(Path)
+            except OSError:
+                pass
+
+    def evict(self):
+        Entries = self.entries()
+        Total = sum(x[1] for x in Entries)
+        for Files, Size, LastUse in Entries:
+            if Total <= self.MaxSize:
+                break
+            self._remove(Files)
+            Total -= Size
+
+    def clear(self):
+        for Files, Size, LastUse in self.entries():
+            self._remove(Files)
+
+
+class ModelCache(DiskCache):
+    """On-disk cache of parsed LMD data.
+
+    Entries are keyed by the file contents, the parser version and the
+    version setting. Each is a JSON file holding everything but the arrays,
+    which are packed in a .bin next to it and read back as views of a single
+    memory map. Reading an entry bumps its mtime, the least recently used
+    ones are evicted once the cache grows over MaxSize bytes.
+    """
+    # Bump whenever ReadLmd's output changes
+    ParserVersion = 4
+    Suffix = '.json'
+
+    def key(self, filepath, Version):
+        Hash = hashlib.blake2b(digest_size=20)
+        Hash.update("{}|{}|".format(self.ParserVersion, Version).encode('utf-8'))
+        with open(filepath, 'rb') as f:
+            for Chunk in iter(lambda: f.read(1 << 20), b''):
+                Hash.update(Chunk)
+        return Hash.hexdigest()
+
+    def _files(self, Key):
+        Base = os.path.join(self.directory, Key)
+        return Base + '.json', Base + '.bin'
+
+    def store(self, Key, Data):
+        Arrays = []
+        Offset = 0
+
+        def Pack(Array):
+            nonlocal Offset
+            if Array is None:
+                return None
+            Array = np.ascontiguousarray(Array)
+            Offset += -Offset % 16
+            Arrays.append((Offset, Array))
+            Entry = [Offset, Array.dtype.str, list(Array.shape)]
+            Offset += Array.nbytes
+            return Entry
+
+        Bones = Data["Skeleton"]
+        Meta = {
+            "ParserVersion": self.ParserVersion,
+            "Version": Data["Version"],
+            "Skeleton": [{x: Bone[x] for x in Bone if x != "Matrix"} for Bone in Bones],
+            "BoneMatrices": Pack(np.array([Bone["Matrix"] for Bone in Bones], dtype=np.float32).reshape(-1, 4, 4)),
+            "Materials": Data["Materials"],
+            "MeshIndex": Data["MeshIndex"],
+            "Meshes": [],
+        }
+        for Mesh in Data["Meshes"]:
+            Meta["Meshes"].append({
+                x: {"Array": Pack(Value)} if isinstance(Value, np.ndarray) or Value is None else Value
+                for x, Value in Mesh.items()})
+
+        JsonPath, BinPath = self._files(Key)
+        Temp = '.{}.tmp'.format(os.getpid())
+        with open(BinPath + Temp, 'wb') as f:
+            for ArrayOffset, Array in Arrays:
+                f.write(b'\0' * (ArrayOffset - f.tell()))
+                f.write(Array.tobytes())
+        os.replace(BinPath + Temp, BinPath)
+        with open(JsonPath + Temp, 'w', encoding='utf-8') as f:
+            json.dump(Meta, f)
+        os.replace(JsonPath + Temp, JsonPath)
+
+    def load(self, Key, filepath):
+        """Return the cached data of a file, None when there's no entry"""
+        JsonPath, BinPath = self._files(Key)
+        try:
+            with open(JsonPath, 'r', encoding='utf-8') as f:
+                Meta = json.load(f)
+            if Meta.get("ParserVersion") != self.ParserVersion:
+                return None
+            if os.path.getsize(BinPath):
+                Blob = np.memmap(BinPath, dtype=np.uint8, mode='r')
+            else:
+                Blob = np.zeros(0, dtype=np.uint8)
+            os.utime(JsonPath)
+        except (OSError, ValueError):
+            return None
+
+        def Unpack(Entry):
+            if Entry is None:
+                return None
+            ArrayOffset, dtype, shape = Entry
+            dtype = np.dtype(dtype)
+            Size = int(np.prod(shape)) * dtype.itemsize
+            return Blob[ArrayOffset:ArrayOffset + Size].view(dtype).reshape(shape)
+
+        Matrices = Unpack(Meta["BoneMatrices"])
+        Skeleton = []
+        for Bone, Matrix in zip(Meta["Skeleton"], Matrices):
+            Bone["Matrix"] = Matrix
+            Bone["Position"] = tuple(Bone["Position"])
+            Skeleton.append(Bone)
+        Meshes = []
+        for Mesh in Meta["Meshes"]:
+            Meshes.append({x: Unpack(Value["Array"]) if isinstance(Value, dict) and "Array" in Value else Value
+                           for x, Value in Mesh.items()})
+        return {
+            "FilePath": filepath,
+            "Name": os.path.split(filepath)[-1],
+            "Version": Meta["Version"],
+            "Skeleton": Skeleton,
+            "Materials": Meta["Materials"],
+            "MeshIndex": Meta["MeshIndex"],
+            "Meshes": Meshes,
+        }
+
+
+
+class TextureCache(DiskCache):
+    """On-disk cache of decoded KTX textures.
+
+    Entries are keyed by the file contents and the decoder version, each is
+    a small header and the RGBA pixels, read back through a memory map.
+    Least recently used entries are evicted above MaxSize bytes.
+    """
+    # Bump whenever DecodeKtx's output changes
+    DecoderVersion = 1
+    Suffix = '.rgba'
+    _Header = struct.Struct('<4sII')
+
+    def key(self, Data):
+        Hash = hashlib.blake2b(digest_size=20)
+        Hash.update("{}|".format(self.DecoderVersion).encode('utf-8'))
+        Hash.update(Data)
+        return Hash.hexdigest()
+
+    def _path(self, Key):
+        return os.path.join(self.directory, Key + self.Suffix)
+
+    def _files(self, Key):
+        return (self._path(Key),)
+
+    def store(self, Key, Pixels):
+        Path = self._path(Key)
+        Temp = '{}.{}.{}.tmp'.format(Path, os.getpid(), threading.get_ident())
+        with open(Temp, 'wb') as f:
+            f.write(self._Header.pack(b'RGBA', Pixels.shape[1], Pixels.shape[0]))
+            f.write(np.ascontiguousarray(Pixels, dtype=np.uint8).tobytes())
+        os.replace(Temp, Path)
+
+    def load(self, Key):
+        """Return the cached (height, width, 4) pixels, None when there's no entry"""
+        Path = self._path(Key)
+        try:
+            with open(Path, 'rb') as f:
+                Magic, Width, Height = self._Header.unpack(f.read(self._Header.size))
+            if Magic != b'RGBA' or os.path.getsize(Path) != self._Header.size + Width * Height * 4:
+                return None
+            Pixels = np.memmap(Path, dtype=np.uint8, mode='r', offset=self._Header.size, shape=(Height, Width, 4))
+            os.utime(Path)
+        except (OSError, ValueError, struct.error):
+            return None
+        return Pixels
+
+
+def _process_context():
+    Context = multiprocessing.get_context('spawn')
+    # Before 2.91 sys.executable is Blender itself, workers need the bundled Python
+    if bpy is not None and getattr(bpy.app, 'binary_path_python', None):
+        Context.set_executable(bpy.app.binary_path_python)
+    return Context
+
+
+def ReadLmdFiles(filepaths, Version, Processes=0, Cache=None, Profile=None, Selection=None):
+    """Parse LMD files, in a process pool when there is more than one.
+
+    Yields (file path, parsed data, error) in the given order as soon as each
+    file is ready, so building can start while the rest is still parsing.
+    A file that fails to parse gives None and the formatted traceback.
+    Files found in the cache are memory-mapped from it instead of parsed.
+    Only the meshes Selection decodes are read, see ReadLmd.
+    Parse times, including those of the workers, are added to Profile.
+    """
+    Profile = Profile or ImportProfile()
+    Keys = [None] * len(filepaths)
+    Cached = [None] * len(filepaths)
+    if Cache is not None:
+        with Profile.phase("cache_load"):
+            for i, filepath in enumerate(filepaths):
+                try:
+                    Keys[i] = Cache.key(filepath, Version)
+                except OSError:
+                    continue
+                Cached[i] = Cache.load(Keys[i], filepath)
+        Profile.count("cache_hits", sum(x is not None for x in Cached))
+    Pending = [i for i, Data in enumerate(Cached) if Data is None]
+
+    def Read(i):
+        try:
+            with Profile.phase("parse"):
+                return filepaths[i], ReadLmd(filepaths[i], Version, Cache, Keys[i], Profile, Selection), None
+        except Exception:
+            return filepaths[i], None, traceback.format_exc()
+
+    if Processes <= 0:
+        Processes = os.cpu_count() or 1
+    Processes = min(Processes, len(Pending))
+    Done = 0
+    # Run from Blender's text editor the workers couldn't import this module
+    if Processes > 1 and not (bpy is not None and __name__ == "__main__"):
+        try:
+            with concurrent.futures.ProcessPoolExecutor(Processes, mp_context=_process_context()) as Pool:
+                Futures = {i: Pool.submit(_ReadLmdProfiled, filepaths[i], Version, Cache, Keys[i], Selection)
+                           for i in Pending}
+                try:
+                    while Done < len(filepaths):
+                        if Done in Futures:
+                            try:
+                                Data, WorkerProfile = Futures[Done].result()
+                                # Summed over the workers, so it can exceed the wall clock time
+                                with Profile.phase("parse_in_workers"):
+                                    Profile.merge(WorkerProfile)
+                                Result = (Data, None)
+                            except concurrent.futures.process.BrokenProcessPool:
+                                raise
+                            except Exception:
+                                Result = (None, traceback.format_exc())
+                        else:
+                            Result = (Cached[Done], None)
+                        yield (filepaths[Done],) + Result
+                        Done += 1
+                finally:
+                    # Closed early, don't wait for the files nobody will read
+                    for Future in Futures.values():
+                        Future.cancel()
+        except (concurrent.futures.process.BrokenProcessPool, OSError):
+            log.warning("Parsing in worker processes failed, continuing in this one:", exc_info=True)
+    for i in range(Done, len(filepaths)):
+        if Cached[i] is not None:
+            yield filepaths[i], Cached[i], None
+        else:
+            yield Read(i)
+
+    if Cache is not None:
+        Cache.evict()
+
+
+def FindImportedArmature(name):
+    """Armature object a file was imported as before, by the name BuildSkeleton gives it"""
+    obj = bpy.data.objects.get(name)
+    if obj is not None and obj.type == 'ARMATURE' and obj.library is None:
+        return obj
+    return None
+
+
+def BuildLmdSteps(Data, SaveTextureIndex=False, MergeDistance=None, Prefetch=None, Profile=None, Selection=None,
+                  Registry=None, TextureCache=None, Reload=False, bCustomNormals=True):
+    """Build a parsed LMD file a step at a time.
+
+    Yields the armature object after the skeleton, after the materials and
+    after every mesh; nothing is timed while the caller holds a step.
+    With Reload, the objects of a file imported before are updated in place
+    where their content changed, see ReloadMesh.
+    """
+    Profile = Profile or ImportProfile()
+    Selection = Selection or MeshSelection()
+    Existing = FindImportedArmature(Data["Name"]) if Reload else None
+    if Existing is not None and Registry is None:
+        # Otherwise unchanged materials would be copied, meshes and armatures stay unshared
+        Registry = DatablockRegistry(('materials',))
+    log.info("=====\n%s file %s", "Reloading" if Existing is not None else "Loading", Data["FilePath"])
+    with Profile.phase("build"):
+        with Profile.phase("skeleton"):
+            if Existing is not None:
+                ArmatureObject = Existing
+                if ReloadSkeleton(ArmatureObject, Data["Skeleton"], Registry):
+                    log.info("Updated the skeleton")
+            else:
+                ArmatureObject = BuildSkeleton(Data["Name"], Data["Skeleton"], Registry)
+                ArmatureObject.rotation_euler = (1.5707963705062866, 0, 0)
+    yield ArmatureObject
+
+    with Profile.phase("build"):
+        Materials = BuildMaterials(Data["FilePath"], Data["Materials"], SaveTextureIndex, Prefetch, Profile, Registry,
+                                   TextureCache)
+    yield ArmatureObject
+
+    log.info("Loading meshes:")
+    # Chunks are matched by name and how many chunks of that name come before them
+    Keys = []
+    Occurrences = {}
+    for Entry in Data["MeshIndex"]:
+        Keys.append((Entry["Name"], Occurrences.get(Entry["Name"], 0)))
+        Occurrences[Entry["Name"]] = Keys[-1][1] + 1
+    Children = {}
+    if Existing is not None:
+        for obj in ArmatureObject.children:
+            Children.setdefault(MeshKey(obj), []).append(obj)
+    Matched = set()
+    # Cached files come with every mesh decoded, whatever the selection
+    Decoded = {Mesh["Offset"]: Mesh for Mesh in Data["Meshes"]}
+    for Entry, Key in zip(Data["MeshIndex"], Keys):
+        if not Selection.selected(Entry["Name"]):
+            continue
+        Previous = Children[Key].pop(0) if Children.get(Key) else None
+        Matched.add(Key)
+        obj = None
+        with Profile.phase("build"), Profile.phase("meshes"):
+            Material = Materials.get(Entry["Material"])
+            if Selection.decode(Entry["Name"]) and Entry["Offset"] in Decoded:
+                Mesh = Decoded[Entry["Offset"]]
+                if Previous is None:
+                    obj = BuildMesh(Mesh, ArmatureObject, MergeDistance, Profile, Material, Registry,
+                                    bCustomNormals)
+                elif ReloadMesh(Previous, Mesh, MergeDistance, Profile, Material, Registry, bCustomNormals):
+                    Profile.count("reloaded_meshes")
+                else:
+                    log.info('- %s: %s - unchanged', Entry["Name"], Entry["Material"])
+                    Profile.count("unchanged_meshes")
+            else:
+                if Previous is not None:
+                    RemoveObject(Previous)
+                obj = BuildProxy(Entry, Data, ArmatureObject, MergeDistance, Material, bCustomNormals)
+            if obj is not None:
+                obj["lmd_mesh_occurrence"] = Key[1]
+        yield ArmatureObject
+
+    # Chunks no longer in the file and duplicates left by older imports, those left out by the selection stay
+    InFile = set(Keys)
+    for Key, Objects in Children.items():
+        for obj in Objects:
+            if "lmd_mesh_name" in obj and (Key not in InFile or Key in Matched):
+                log.info('- %s - removed', Key[0])
+                RemoveObject(obj)
+
+
+def MeshKey(obj):
+    """Chunk an imported object was built from, as its name and occurrence of that name in the file"""
+    return obj.get("lmd_mesh_name", obj.name), obj.get("lmd_mesh_occurrence", 0)
+
+
+def RemoveObject(obj):
+    """Remove an object, and its data when nothing else uses it"""
+    Owner = obj.data
+    bpy.data.objects.remove(obj)
+    if Owner is not None and Owner.users == 0:
+        if isinstance(Owner, bpy.types.Mesh):
+            bpy.data.meshes.remove(Owner)
+        elif isinstance(Owner, bpy.types.Armature):
+            bpy.data.armatures.remove(Owner)
+
+
+def RemoveLmdObjects(ArmatureObject):
+    """Remove an imported armature with its mesh objects"""
+    for obj in list(ArmatureObject.children) + [ArmatureObject]:
+        RemoveObject(obj)
+
+
+class ImportJob:
+    """Import of several LMD files, all at once or a few steps at a time.
+
+    run() imports everything before returning. After start() a thread
+    parses the files while tick() builds them on the main thread, one
+    skeleton, material table or mesh per step. Cancelling removes the
+    objects of the file being built, the files built before it stay; a
+    file being reloaded keeps the meshes already updated.
+    """
+    Datablocks = ('objects', 'meshes', 'armatures', 'materials', 'textures', 'images')
+    _End = object()
+
+    def __init__(self, filepaths, Version, Processes=0, Cache=None, TextureCache=None, Selection=None, Registry=None,
+                 SaveTextureIndex=False, MergeDistance=None, Reload=False, CustomNormals=True):
+        self.filepaths = filepaths
+        self.version = Version
+        self.processes = Processes
+        self.cache = Cache
+        self.texture_cache = TextureCache
+        self.selection = Selection or MeshSelection()
+        self.registry = Registry
+        self.save_texture_index = SaveTextureIndex
+        self.merge_distance = MergeDistance
+        self.reload = Reload
+        self.custom_normals = CustomNormals
+        self.profile = ImportProfile()
+        self.datablock_counts = {x: len(getattr(bpy.data, x)) for x in self.Datablocks}
+        self.done = self.failed = 0
+        self.verts_before = self.verts_after = 0
+        self.progress = 0.0
+        self.current = None
+        self.error = None
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.thread = self.steps = None
+
+        self.prefetch = TexturePrefetcher(Cache=TextureCache)
+        with self.profile.phase("texture_index"):
+            for filepath in filepaths:
+                self.prefetch.submit_lmd(filepath, GetTextureIndex(os.path.dirname(os.path.realpath(filepath)),
+                                                                   SaveTextureIndex))
+
+    def _build(self, Results):
+        """Build every parsed file, yields after each step and True while waiting for the parser"""
+        for Item in Results:
+            if Item is None:
+                yield True
+                continue
+            filepath, Data, Error = Item
+            if Data is None:
+                log.error("=====\nFailed to load file %s\n%s", filepath, Error)
+                self.failed += 1
+            else:
+                bNew = not (self.reload and FindImportedArmature(Data["Name"]))
+                StepCount = 2 + sum(self.selection.selected(x["Name"]) for x in Data["MeshIndex"])
+                for Step, ArmatureObject in enumerate(BuildLmdSteps(
+                        Data, self.save_texture_index, self.merge_distance, self.prefetch, self.profile,
+                        self.selection, self.registry, self.texture_cache, self.reload, self.custom_normals), 1):
+                    if bNew:
+                        self.current = ArmatureObject
+                    self.progress = (self.done + min(Step / StepCount, 1.0)) / len(self.filepaths)
+                    yield False
+                self.verts_before += sum(len(Mesh["Positions"]) for Mesh in Data["Meshes"]
+                                         if self.selection.decode(Mesh["Name"]))
+                self.verts_after += sum(len(x.data.vertices) for x in ArmatureObject.children if x.type == 'MESH')
+                self.current = None
+            self.done += 1
+            self.progress = self.done / len(self.filepaths)
+            yield False
+
+    def run(self):
+        try:
+            for x in self._build(ReadLmdFiles(self.filepaths, self.version, self.processes, self.cache,
+                                              self.profile, self.selection)):
+                pass
+        finally:
+            self._finish()
+
+    def start(self):
+        self.queue = queue.Queue(2)
+        self.parse_profile = ImportProfile()
+        self.thread = threading.Thread(target=self._parse, daemon=True)
+        self.thread.start()
+        self.steps = self._build(self._parsed())
+
+    def _parse(self):
+        Results = ReadLmdFiles(self.filepaths, self.version, self.processes, self.cache, self.parse_profile,
+                               self.selection)
+        try:
+            for Item in Results:
+                if not self._put(Item):
+                    return
+        except Exception:
+            self.error = traceback.format_exc()
+        finally:
+            Results.close()
+            self._put(self._End)
+
+    def _put(self, Item):
+        """Hand a parsed file to the main thread, False once cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(Item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _parsed(self):
+        while True:
+            try:
+                Item = self.queue.get_nowait()
+            except queue.Empty:
+                yield None
+                continue
+            if Item is self._End:
+                return
+            yield Item
+
+    def tick(self, Budget=0.05):
+        """Build for about Budget seconds, returns False once the job is over"""
+        if self.finished:
+            return False
+        Start = time.perf_counter()
+        try:
+            while time.perf_counter() - Start < Budget:
+                # Waiting for the parser, give the time back
+                if next(self.steps):
+                    break
+        except StopIteration:
+            self._finish()
+        except Exception:
+            self.error = traceback.format_exc()
+            self.cancel()
+        return not self.finished
+
+    def cancel(self):
+        """Stop parsing and remove the objects of the file being built"""
+        if self.finished:
+            return
+        self.cancelled.set()
+        try:
+            if self.steps is not None:
+                self.steps.close()
+            if self.current is not None:
+                RemoveLmdObjects(self.current)
+        except ReferenceError:
+            # Removed from under the job already
+            pass
+        finally:
+            self.current = None
+            self._finish()
+
+    def status(self):
+        Text = "Importing LMD files: {} of {}".format(self.done, len(self.filepaths))
+        Elapsed = time.perf_counter() - self.profile.start
+        if self.progress > 0:
+            Text += ", about {:.0f} s left".format(Elapsed * (1 - self.progress) / self.progress)
+        return Text + " (Esc to cancel)"
+
+    def _finish(self):
+        self.finished = True
+        self.prefetch.close()
+        if self.texture_cache is not None:
+            self.texture_cache.evict()
+        if self.error is not None:
+            log.error("=====\nImport failed\n%s", self.error)
+        # Still running after a cancel, its timings aren't complete
+        if self.thread is not None and not self.thread.is_alive():
+            self.profile.merge(self.parse_profile)
+        for x in self.Datablocks:
+            self.profile.count("new_" + x, len(getattr(bpy.data, x)) - self.datablock_counts[x])
+        self.profile.count("files", self.done - self.failed)
+
+
+class LmdWatcher:
+    """Reloads imported LMD files when they change on disk.
+
+    Polled from a timer; a file is reloaded once it stopped changing for a
+    whole interval, so one being written isn't read half way.
+    """
+    Interval = 1.0
+
+    def __init__(self):
+        # path -> [size and mtime when last loaded, when last polled, import options]
+        self.files = {}
+        self._tick = self.tick
+
+    @staticmethod
+    def _stat(filepath):
+        try:
+            Stat = os.stat(filepath)
+        except OSError:
+            return None
+        return Stat.st_size, Stat.st_mtime_ns
+
+    def watch(self, filepaths, Options):
+        """Start watching files, Options are the ImportJob arguments to reload them with"""
+        for filepath in filepaths:
+            Stat = self._stat(filepath)
+            self.files[filepath] = [Stat, Stat, Options]
+        if self.files and not bpy.app.timers.is_registered(self._tick):
+            bpy.app.timers.register(self._tick, first_interval=self.Interval)
+
+    def stop(self):
+        self.files.clear()
+        if bpy.app.timers.is_registered(self._tick):
+            bpy.app.timers.unregister(self._tick)
+
+    def tick(self):
+        Changed = {}
+        for filepath, Entry in self.files.items():
+            Stat = self._stat(filepath)
+            Settled = Stat == Entry[1]
+            Entry[1] = Stat
+            if Stat is not None and Stat != Entry[0] and Settled:
+                Entry[0] = Stat
+                Changed.setdefault(id(Entry[2]), (Entry[2], []))[1].append(filepath)
+        for Options, filepaths in Changed.values():
+            self.reload(filepaths, Options)
+        return self.Interval if self.files else None
+
+    def reload(self, filepaths, Options):
+        log.info("=====\nReloading %d changed file%s", len(filepaths), '' if len(filepaths) == 1 else 's')
+        Job = ImportJob(filepaths, Reload=True, **Options)
+        Windows = bpy.context.window_manager.windows
+        # Operators only run from timers with a context override
+        Override = contextlib.nullcontext()
+        if len(Windows) and hasattr(bpy.context, 'temp_override'):
+            Override = bpy.context.temp_override(window=Windows[0])
+        with Override:
+            try:
+                Job.run()
+            except Exception:
+                log.exception("Reloading failed")
+            if bpy.ops.ed.undo_push.poll():
+                bpy.ops.ed.undo_push(message="Reload LMD Files")
+        log.info(Job.profile.format())
+
+
+_Watcher = LmdWatcher()
+
+
+# Node groups shared by every imported material
+CO_AO_GROUP = "PokeMas CO AO"
+EXPRESSION_GROUP = "PokeMas Expression Mapping"
+
+
+def node_group_socket(group, in_out, socket_type, name):
+    """Add an input or output to a node group, on every Blender version"""
+    if hasattr(group, 'interface'):
+        return group.interface.new_socket(name, in_out=in_out, socket_type=socket_type)
+    if in_out == 'INPUT':
+        return group.inputs.new(socket_type, name)
+    return group.outputs.new(socket_type, name)
+
+
+def CoAoNodeGroup():
+    """Shared group combining a CO texture with its AO texture, as the BSDF inputs"""
+    group = bpy.data.node_groups.get(CO_AO_GROUP)
+    if group is not None and group.bl_idname == 'ShaderNodeTree':
+        return group
+    group = bpy.data.node_groups.new(CO_AO_GROUP, 'ShaderNodeTree')
+    node_group_socket(group, 'INPUT', 'NodeSocketColor', 'Color')
+    node_group_socket(group, 'INPUT', 'NodeSocketFloat', 'Alpha')
+    node_group_socket(group, 'INPUT', 'NodeSocketColor', 'AO Color')
+    node_group_socket(group, 'INPUT', 'NodeSocketFloat', 'AO Alpha')
+    node_group_socket(group, 'OUTPUT', 'NodeSocketColor', 'Base Color')
+    node_group_socket(group, 'OUTPUT', 'NodeSocketFloat', 'Alpha')
+    node_group_socket(group, 'OUTPUT', 'NodeSocketFloat', 'Specular')
+
+    inputs = group.nodes.new('NodeGroupInput')
+    inputs.location = (-300, 0)
+    outputs = group.nodes.new('NodeGroupOutput')
+    outputs.location = (300, 0)
+    mixRGB = group.nodes.new('ShaderNodeMixRGB')
+    mixRGB.blend_type = 'MULTIPLY'
+    mixRGB.inputs['Fac'].default_value = .3
+
+    group.links.new(inputs.outputs['Color'], mixRGB.inputs['Color1'])
+    group.links.new(inputs.outputs['AO Color'], mixRGB.inputs['Color2'])
+    group.links.new(mixRGB.outputs['Color'], outputs.inputs['Base Color'])
+    group.links.new(inputs.outputs['Alpha'], outputs.inputs['Alpha'])
+    # The group's own socket, named the same on every Blender version
+    group.links.new(inputs.outputs['AO Alpha'], outputs.inputs['Specular'])
+    return group
+
+
+def ExpressionNodeGroup():
+    """Shared UV mapping of the face materials' expression atlases.
+
+    The Location of the Mapping node inside picks the expression of every
+    face material at once, the Offset input shifts a single material.
+    """
+    group = bpy.data.node_groups.get(EXPRESSION_GROUP)
+    if group is not None and group.bl_idname == 'ShaderNodeTree':
+        return group
+    group = bpy.data.node_groups.new(EXPRESSION_GROUP, 'ShaderNodeTree')
+    node_group_socket(group, 'INPUT', 'NodeSocketVector', 'Offset')
+    node_group_socket(group, 'OUTPUT', 'NodeSocketVector', 'CO Vector')
+    node_group_socket(group, 'OUTPUT', 'NodeSocketVector', 'AO Vector')
+
+    inputs = group.nodes.new('NodeGroupInput')
+    inputs.location = (-600, -200)
+    outputs = group.nodes.new('NodeGroupOutput')
+    outputs.location = (400, 0)
+    texCoord = group.nodes.new('ShaderNodeTexCoord')
+    texCoord.location = (-600, 100)
+
+    mappingCo = group.nodes.new('ShaderNodeMapping')
+    mappingCo.name = mappingCo.label = "Expression"
+    mappingCo.location = (-350, 200)
+    offset = group.nodes.new('ShaderNodeVectorMath')
+    offset.operation = 'ADD'
+    offset.location = (100, 200)
+
+    mappingAo = group.nodes.new('ShaderNodeMapping')
+    mappingAo.location = (-350, -150)
+    try:
+        mappingAo.inputs['Scale'].default_value = (4, 4, 1)
+    except KeyError:
+        mappingAo.scale = (4, 4, 1)
+
+    group.links.new(texCoord.outputs['UV'], mappingCo.inputs['Vector'])
+    group.links.new(texCoord.outputs['UV'], mappingAo.inputs['Vector'])
+    group.links.new(mappingCo.outputs['Vector'], offset.inputs[0])
+    group.links.new(inputs.outputs['Offset'], offset.inputs[1])
+    group.links.new(offset.outputs['Vector'], outputs.inputs['CO Vector'])
+    group.links.new(mappingAo.outputs['Vector'], outputs.inputs['AO Vector'])
+    return group
+
+
+def setupMaterialNodes(mat, MaterialNameText, TexSlots, TextureCache=None):
     mat = bpy.data.materials.new(name=MaterialNameText)
     mat.use_nodes = True
     mat.blend_method = 'HASHED'
     bsdf = mat.node_tree.nodes['Principled BSDF']
     for texture in TexSlots:
         tex = bpy.data.textures.get(texture)
-        if tex and tex.image and 'Image Texture.001' not in mat.node_tree.nodes.keys():
+        if tex and tex.image:
             xRef, yRef = -500, 300
             texImageCo = mat.node_tree.nodes.new('ShaderNodeTexImage')
-            texImageCo.image = bpy.data.images.load(tex.image.filepath)
+            texImageCo.image = tex.image
             texImageCo.location = (xRef, yRef)
 
-            texImageAo = mat.node_tree.nodes.new('ShaderNodeTexImage')
-            texImageAo.image = bpy.data.images.load(tex.image.filepath.replace('_co.', '_ao.'))
-            texImageAo.image.colorspace_settings.name = 'Non-Color'
-            texImageAo.location = (xRef, 0)
+            coAo = mat.node_tree.nodes.new('ShaderNodeGroup')
+            coAo.node_tree = CoAoNodeGroup()
+            coAo.location = (xRef + 330, yRef)
+            # Without an AO texture the base color is left as is
+            coAo.inputs['AO Color'].default_value = (1, 1, 1, 1)
 
-            mixRGB = mat.node_tree.nodes.new('ShaderNodeMixRGB')
-            mixRGB.blend_type = 'MULTIPLY'
-            mixRGB.inputs['Fac'].default_value = .3
-            mixRGB.location = (xRef + 330, yRef)
+            # Images are shared by path, an AO path equal to the CO one would be the CO image itself
+            CoPath = ImagePath(tex.image)
+            AoPath = CoPath.replace('_co.', '_ao.')
+            texImageAo = None
+            if AoPath != CoPath and os.path.isfile(AoPath):
+                texImageAo = mat.node_tree.nodes.new('ShaderNodeTexImage')
+                texImageAo.image = LoadImage(AoPath, TextureCache)
+                texImageAo.image.colorspace_settings.name = 'Non-Color'
+                texImageAo.location = (xRef, 0)
+                mat.node_tree.links.new(texImageAo.outputs['Color'], coAo.inputs['AO Color'])
+                mat.node_tree.links.new(texImageAo.outputs['Alpha'], coAo.inputs['AO Alpha'])
 
-            mat.node_tree.links.new(texImageCo.outputs['Color'], mixRGB.inputs['Color1'])
-            mat.node_tree.links.new(texImageCo.outputs['Alpha'], bsdf.inputs['Alpha'])
-            mat.node_tree.links.new(texImageAo.outputs['Color'], mixRGB.inputs['Color2'])
-            mat.node_tree.links.new(texImageAo.outputs['Alpha'], bsdf.inputs['Specular'])
-            mat.node_tree.links.new(mixRGB.outputs['Color'], bsdf.inputs['Base Color'])
+            mat.node_tree.links.new(texImageCo.outputs['Color'], coAo.inputs['Color'])
+            mat.node_tree.links.new(texImageCo.outputs['Alpha'], coAo.inputs['Alpha'])
+            mat.node_tree.links.new(coAo.outputs['Base Color'], bsdf.inputs['Base Color'])
+            mat.node_tree.links.new(coAo.outputs['Alpha'], bsdf.inputs['Alpha'])
+            # Renamed in Blender 4.0
+            Specular = bsdf.inputs.get('Specular IOR Level') or bsdf.inputs['Specular']
+            mat.node_tree.links.new(coAo.outputs['Specular'], Specular)
 
             if MaterialNameText.endswith("face"):
-                mappingCo = mat.node_tree.nodes.new('ShaderNodeMapping')
-                mappingCo.location = (xRef - 400, yRef)
+                expression = mat.node_tree.nodes.new('ShaderNodeGroup')
+                expression.node_tree = ExpressionNodeGroup()
+                expression.location = (xRef - 400, yRef - 100)
+
+                mat.node_tree.links.new(expression.outputs['CO Vector'], texImageCo.inputs['Vector'])
+                if texImageAo is not None:
+                    mat.node_tree.links.new(expression.outputs['AO Vector'], texImageAo.inputs['Vector'])
+            # Only the first texture is used
+            break
+    return mat
+
+
+class GltfBuffer:
+    """Binary buffer, buffer views and accessors of a glTF file being written"""
+    ComponentTypes = {np.dtype(np.int8): 5120, np.dtype(np.uint8): 5121, np.dtype(np.int16): 5122,
+                      np.dtype(np.uint16): 5123, np.dtype(np.uint32): 5125, np.dtype(np.float32): 5126}
+    Types = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4", 16: "MAT4"}
+
+    def __init__(self):
+        self.data = bytearray()
+        self.views = []
+        self.accessors = []
+
+    def accessor(self, Array, Target=None, MinMax=False):
+        Array = np.ascontiguousarray(Array)
+        self.data += b'\0' * (-len(self.data) % 4)
+        View = {"buffer": 0, "byteOffset": len(self.data), "byteLength": Array.nbytes}
+        if Target is not None:
+            View["target"] = Target
+        self.data += Array.tobytes()
+        self.views.append(View)
+        Width = int(np.prod(Array.shape[1:]))
+        Accessor = {
+            "bufferView": len(self.views) - 1,
+            "componentType": self.ComponentTypes[Array.dtype],
+            "count": len(Array),
+            "type": self.Types[Width],
+        }
+        if MinMax and len(Array):
+            Flat = Array.reshape(len(Array), -1)
+            Accessor["min"] = Flat.min(axis=0).tolist()
+            Accessor["max"] = Flat.max(axis=0).tolist()
+        self.accessors.append(Accessor)
+        return len(self.accessors) - 1
+
+
+def WritePng(filepath, Pixels):
+    """Write an (height, width, 4) RGBA uint8 array, top row first, as PNG"""
+    Height, Width = Pixels.shape[:2]
+
+    def Chunk(Type, Body):
+        return struct.pack('>I', len(Body)) + Type + Body + struct.pack('>I', zlib.crc32(Type + Body))
+
+    # Filter type 0 in front of every row
+    Rows = np.zeros((Height, Width * 4 + 1), dtype=np.uint8)
+    Rows[:, 1:] = Pixels.reshape(Height, Width * 4)
+    Temp = '{}.{}.tmp'.format(filepath, os.getpid())
+    with open(Temp, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(Chunk(b'IHDR', struct.pack('>IIBBBBB', Width, Height, 8, 6, 0, 0, 0)))
+        f.write(Chunk(b'IDAT', zlib.compress(Rows.tobytes(), 6)))
+        f.write(Chunk(b'IEND', b''))
+    os.replace(Temp, filepath)
+
+
+def GltfImage(TexIndex, TexFileName, Directory):
+    """URI of the texture file a texture name refers to, relative to Directory.
+
+    glTF only takes PNG and JPEG images, PNG versions are preferred over the
+    TGA name the LMD file refers to. The game's KTX textures are decoded to a
+    PNG in Directory. None when there is no such image.
+    """
+    TexFilePath = ResolveTexture(TexIndex, TexFileName)
+    if TexFilePath and not TexFilePath.lower().endswith('.png'):
+        Files = TexIndex.find(os.path.splitext(TexFileName)[0] + "*.png")
+        TexFilePath = Files[0] if Files else TexFilePath
+    if TexFilePath and TexFilePath.lower().endswith('.ktx'):
+        PngPath = os.path.join(Directory, os.path.splitext(os.path.basename(TexFilePath))[0] + '.png')
+        try:
+            if not os.path.exists(PngPath) or os.path.getmtime(PngPath) < os.path.getmtime(TexFilePath):
+                WritePng(PngPath, DecodeKtxFile(TexFilePath))
+        except (OSError, ValueError) as e:
+            log.warning("Leaving out texture %s: %s", TexFilePath, e)
+            return None
+        TexFilePath = PngPath
+    if not TexFilePath or not TexFilePath.lower().endswith(('.png', '.jpg', '.jpeg')):
+        return None
+    return urllib.parse.quote(os.path.relpath(TexFilePath, Directory).replace(os.sep, '/'))
 
-                mappingAo = mat.node_tree.nodes.new('ShaderNodeMapping')
-                mappingAo.location = (xRef - 400, -80)
-                try:
-                    mappingAo.inputs['Scale'].default_value = (4, 4, 1)
-                except KeyError:
-                    mappingAo.scale = (4, 4, 1)
-                    mappingAo.location[1] = 0
 
-                texCoord = mat.node_tree.nodes.new('ShaderNodeTexCoord')
-                texCoord.location = (xRef - 600, yRef - 180)
+def GltfDocument(Data, filepath):
+    """glTF JSON and binary chunk of parsed LMD data, skinned, Y up like LMD files"""
+    Buffer = GltfBuffer()
+    Bones = Data["Skeleton"]
+    Parents, Rest = BoneRestMatrices(Bones)
 
-                mat.node_tree.links.new(mappingCo.outputs['Vector'], texImageCo.inputs['Vector'])
-                mat.node_tree.links.new(mappingAo.outputs['Vector'], texImageAo.inputs['Vector'])
-                mat.node_tree.links.new(texCoord.outputs['UV'], mappingCo.inputs['Vector'])
-                mat.node_tree.links.new(texCoord.outputs['UV'], mappingAo.inputs['Vector'])
+    # Joints, their nodes come first so node and bone indices match
+    Nodes = []
+    ParentRest = np.where(Parents[:, None, None] >= 0, Rest[Parents], np.eye(4))
+    Local = np.linalg.inv(ParentRest) @ Rest
+    for i, Bone in enumerate(Bones):
+        Nodes.append({"name": Bone["Name"], "matrix": Local[i].T.ravel().tolist()})
+    for i, Parent in enumerate(Parents):
+        if Parent >= 0:
+            Nodes[Parent].setdefault("children", []).append(i)
+    SceneNodes = [i for i, Parent in enumerate(Parents) if Parent < 0]
+    Skins = []
+    if Bones:
+        InverseBind = np.linalg.inv(Rest).transpose(0, 2, 1).astype(np.float32)
+        Skins.append({"joints": list(range(len(Bones))), "inverseBindMatrices": Buffer.accessor(InverseBind)})
+
+    # Materials, the CO texture as base color and the AO one as occlusion
+    TexIndex = GetTextureIndex(os.path.dirname(os.path.realpath(Data["FilePath"])))
+    Directory = os.path.dirname(os.path.abspath(filepath))
+    TextureFiles = {x["Ref"]: x["FileName"] for x in Data["Materials"]["Textures"]}
+    Images, Textures, Materials, MaterialIndex = [], [], [], {}
+
+    def Texture(Uri):
+        Images.append({"uri": Uri})
+        Textures.append({"source": len(Images) - 1})
+        return len(Textures) - 1
+
+    bTextureTransform = False
+    for Material in Data["Materials"]["Materials"]:
+        Entry = {"name": Material["Name"], "alphaMode": "MASK", "doubleSided": False,
+                 "pbrMetallicRoughness": {"metallicFactor": 0.0, "roughnessFactor": 0.5}}
+        for Ref in Material["TexSlots"]:
+            Uri = TextureFiles.get(Ref) and GltfImage(TexIndex, TextureFiles[Ref], Directory)
+            if not Uri:
+                continue
+            Entry["pbrMetallicRoughness"]["baseColorTexture"] = {"index": Texture(Uri)}
+            AoName = TextureFiles[Ref].replace('_co.', '_ao.')
+            AoUri = AoName != TextureFiles[Ref] and GltfImage(TexIndex, AoName, Directory)
+            if AoUri and AoUri != Uri:
+                Entry["occlusionTexture"] = {"index": Texture(AoUri), "strength": 0.3}
+                if Material["Name"].endswith("face"):
+                    Entry["occlusionTexture"]["extensions"] = {"KHR_texture_transform": {"scale": [4, 4]}}
+                    bTextureTransform = True
+            break
+        MaterialIndex.setdefault(Material["Name"], len(Materials))
+        Materials.append(Entry)
+
+    # Meshes, joint and bone indices match
+    Meshes = []
+    for Mesh in Data["Meshes"]:
+        # Back to a top left origin
+        UVs = np.array(Mesh["UVs"], dtype=np.float32)
+        UVs[:, 1] = 1 - UVs[:, 1]
+        Attributes = {
+            "POSITION": Buffer.accessor(Mesh["Positions"], 34962, MinMax=True),
+            "TEXCOORD_0": Buffer.accessor(UVs, 34962),
+        }
+        # glTF normals must be unit vectors, leave them out when some are unset
+        if len(Mesh["Normals"]) and Mesh["Normals"].any(axis=1).all():
+            Attributes["NORMAL"] = Buffer.accessor(Mesh["Normals"], 34962)
+        if Mesh["Colors"] is not None:
+            Attributes["COLOR_0"] = Buffer.accessor(Mesh["Colors"].astype(np.float32), 34962)
+        if Bones:
+            Table = np.append(Mesh["WeightBoneIDs"], -1).astype(np.int64)
+            BoneIndices = Mesh["BoneIndices"].astype(np.int64)
+            Joints = Table[np.where(BoneIndices < len(Table) - 1, BoneIndices, -1)]
+            Weights = np.where(Joints >= 0, Mesh["Weights"], 0).astype(np.float32)
+            Joints = np.maximum(Joints, 0)
+            Total = Weights.sum(axis=1, keepdims=True)
+            # Unweighted vertices follow the first joint
+            Weights = np.where(Total > 0, Weights / np.where(Total > 0, Total, 1), [[1, 0, 0, 0]]).astype(np.float32)
+            Attributes["JOINTS_0"] = Buffer.accessor(Joints.astype(np.uint8 if len(Bones) <= 0x100 else np.uint16),
+                                                     34962)
+            Attributes["WEIGHTS_0"] = Buffer.accessor(Weights, 34962)
+        Primitive = {
+            "attributes": Attributes,
+            "indices": Buffer.accessor(Mesh["Faces"].ravel().astype(np.uint32), 34963),
+        }
+        if Mesh["Material"] in MaterialIndex:
+            Primitive["material"] = MaterialIndex[Mesh["Material"]]
+        Meshes.append({"name": Mesh["Name"], "primitives": [Primitive]})
+        Node = {"name": Mesh["Name"], "mesh": len(Meshes) - 1}
+        if Skins:
+            Node["skin"] = 0
+        Nodes.append(Node)
+        SceneNodes.append(len(Nodes) - 1)
+
+    Document = {
+        "asset": {"version": "2.0", "generator": "io_import_pokemon_masters {}".format(
+            '.'.join(str(x) for x in bl_info["version"]))},
+        "scene": 0,
+        "scenes": [{"name": Data["Name"], "nodes": SceneNodes}],
+        "nodes": Nodes,
+        "meshes": Meshes,
+        "materials": Materials,
+        "textures": Textures,
+        "images": Images,
+        "skins": Skins,
+        "accessors": Buffer.accessors,
+        "bufferViews": Buffer.views,
+        "buffers": [{"byteLength": len(Buffer.data)}],
+    }
+    if bTextureTransform:
+        Document["extensionsUsed"] = ["KHR_texture_transform"]
+    # Empty arrays aren't valid glTF
+    Document = {x: Value for x, Value in Document.items() if Value != []}
+    return Document, bytes(Buffer.data)
+
+
+def WriteGltf(Data, filepath):
+    """Write parsed LMD data as .glb, or as .gltf with a .bin next to it"""
+    Document, Binary = GltfDocument(Data, filepath)
+    Temp = '.{}.tmp'.format(os.getpid())
+    if filepath.lower().endswith('.gltf'):
+        BinPath = os.path.splitext(filepath)[0] + '.bin'
+        Document["buffers"][0]["uri"] = urllib.parse.quote(os.path.basename(BinPath))
+        with open(BinPath + Temp, 'wb') as f:
+            f.write(Binary)
+        os.replace(BinPath + Temp, BinPath)
+        with open(filepath + Temp, 'w', encoding='utf-8') as f:
+            json.dump(Document, f)
+    else:
+        Json = json.dumps(Document, separators=(',', ':')).encode('utf-8')
+        Json += b' ' * (-len(Json) % 4)
+        Binary += b'\0' * (-len(Binary) % 4)
+        with open(filepath + Temp, 'wb') as f:
+            f.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(Json) + 8 + len(Binary)))
+            f.write(struct.pack('<I4s', len(Json), b'JSON') + Json)
+            f.write(struct.pack('<I4s', len(Binary), b'BIN\0') + Binary)
+    os.replace(filepath + Temp, filepath)
+
+
+def ConvertLmd(Source, Destination, Version):
+    """Convert one LMD file to glTF, returns the formatted traceback on failure"""
+    try:
+        os.makedirs(os.path.dirname(Destination) or '.', exist_ok=True)
+        WriteGltf(ReadLmd(Source, Version), Destination)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+class ConversionManifest:
+    """Input hashes of the files converted by a previous run.
+
+    A file whose size and mtime didn't change keeps its stored hash, others
+    are hashed again, so unchanged files are skipped without reading them.
+    """
+    # Bump whenever the glTF output changes
+    FormatVersion = 2
+
+    def __init__(self, filepath, Options):
+        self.filepath = filepath
+        self.options = "{}|{}|{}".format(self.FormatVersion, ModelCache.ParserVersion, Options)
+        self.entries = {}
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                Data = json.load(f)
+            if Data.get('options') == self.options:
+                self.entries = Data['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def hash(filepath):
+        Hash = hashlib.blake2b(digest_size=20)
+        with open(filepath, 'rb') as f:
+            for Chunk in iter(lambda: f.read(1 << 20), b''):
+                Hash.update(Chunk)
+        return Hash.hexdigest()
+
+    def check(self, RelPath, Source, Destination):
+        """Return the entry to record for a file and whether it is up to date"""
+        Stat = os.stat(Source)
+        Old = self.entries.get(RelPath)
+        if Old and Old['size'] == Stat.st_size and Old['mtime'] == Stat.st_mtime_ns:
+            Hash = Old['hash']
+        else:
+            Hash = self.hash(Source)
+        Entry = {'size': Stat.st_size, 'mtime': Stat.st_mtime_ns, 'hash': Hash}
+        return Entry, bool(Old) and Old['hash'] == Hash and os.path.exists(Destination)
+
+    def save(self):
+        with open(self.filepath + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'options': self.options, 'files': self.entries}, f, indent=0, sort_keys=True)
+        os.replace(self.filepath + '.tmp', self.filepath)
+
+
+def ConvertTree(Source, Output, Version="1.2+", Format="glb", Processes=0, Force=False):
+    """Convert every LMD file under Source to glTF files in the same layout under Output.
+
+    Returns the number of files that failed.
+    """
+    Jobs = []
+    for root, dirs, files in os.walk(Source):
+        dirs.sort()
+        for x in sorted(files):
+            if x.lower().endswith(".lmd"):
+                RelPath = os.path.relpath(os.path.join(root, x), Source).replace(os.sep, '/')
+                Jobs.append((RelPath, os.path.join(root, x),
+                             os.path.join(Output, os.path.splitext(RelPath)[0] + '.' + Format)))
+    os.makedirs(Output, exist_ok=True)
+    Manifest = ConversionManifest(os.path.join(Output, 'manifest.json'), "{}|{}".format(Version, Format))
+
+    Entries, Pending = {}, []
+    for RelPath, Src, Dst in Jobs:
+        Entry, bUpToDate = Manifest.check(RelPath, Src, Dst)
+        if bUpToDate and not Force:
+            Entries[RelPath] = Entry
+        else:
+            Pending.append((RelPath, Src, Dst, Entry))
+    log.info("%d LMD files, %d to convert", len(Jobs), len(Pending))
+    # Files removed since the last run are dropped along with the failures
+    Manifest.entries = Entries
+
+    if Processes <= 0:
+        Processes = os.cpu_count() or 1
+    Failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max(min(Processes, len(Pending)), 1),
+                                                mp_context=_process_context()) as Pool:
+        Futures = {Pool.submit(ConvertLmd, Src, Dst, Version): (RelPath, Entry)
+                   for RelPath, Src, Dst, Entry in Pending}
+        for Done, Future in enumerate(concurrent.futures.as_completed(Futures), 1):
+            RelPath, Entry = Futures[Future]
+            Error = Future.result()
+            if Error:
+                Failed += 1
+                log.error("Failed to convert %s\n%s", RelPath, Error)
+            else:
+                Manifest.entries[RelPath] = Entry
+                log.info("[%d/%d] %s", Done, len(Pending), RelPath)
+            # Keep the progress of interrupted runs
+            if Done % 100 == 0:
+                Manifest.save()
+    Manifest.save()
+    return Failed
+
+
+def main(argv=None):
+    """Command line converter, runs without Blender"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="python -m io_import_pokemon_masters",
+        description="Convert a directory tree of LMD files to glTF, skipping files converted before")
+    parser.add_argument('source', help="directory searched for LMD files, including subdirectories")
+    parser.add_argument('output', help="directory the glTF files and manifest.json are written to")
+    parser.add_argument('--version', choices=("1.0", "1.2+"), default="1.2+", help="LMD version")
+    parser.add_argument('--format', choices=("glb", "gltf"), default="glb")
+    parser.add_argument('--processes', type=int, default=0, help="worker processes, 0 uses one per CPU core")
+    parser.add_argument('--force', action='store_true', help="convert files even when they didn't change")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    set_log_level('DEBUG' if args.verbose else 'INFO')
+    Failed = ConvertTree(args.source, args.output, args.version, args.format, args.processes, args.force)
+    if Failed:
+        log.error("%d file%s failed to convert", Failed, '' if Failed == 1 else 's')
+        return 1
+    return 0
 
 
 def select_all(select):
@@ -528,15 +3101,30 @@ def menu_func_import(self, context):
     self.layout.operator(PokeMasImport.bl_idname, text="Pokémon Masters (.lmd)")
 
 
+def menu_func_object(self, context):
+    self.layout.operator(PokeMasLoadProxies.bl_idname)
+    if _Watcher.files:
+        self.layout.operator(PokeMasStopWatching.bl_idname)
+
+
 def register():
     bpy.utils.register_class(PokeMasImport)
+    bpy.utils.register_class(PokeMasLoadProxies)
+    bpy.utils.register_class(PokeMasStopWatching)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.types.VIEW3D_MT_object.append(menu_func_object)
 
 
 def unregister():
     bpy.utils.unregister_class(PokeMasImport)
+    bpy.utils.unregister_class(PokeMasLoadProxies)
+    bpy.utils.unregister_class(PokeMasStopWatching)
+    _Watcher.stop()
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_object)
        
 
 if __name__ == "__main__":
+    if bpy is None:
+        sys.exit(main())
     register()